@@ -0,0 +1,138 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+
+from api.replicas import reads_from_replica, use_primary
+
+TOKEN_KEY = "auth-token:{}"
+# Счётчики пользователя меняются в базе через F(): в кэш они не попадают
+# и при обращении читаются из базы
+UNCACHED_FIELDS = ("recipes_count", "subscribers_count")
+
+
+def token_setting(name, default):
+    return getattr(settings, f"AUTH_TOKEN_{name}", default)
+
+
+class LocalCache:
+    """LRU-кэш процесса с ограниченным временем жизни записей."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_tokens = LocalCache(token_setting("LOCAL_SIZE", 1024))
+
+
+def get_cache():
+    return caches[token_setting("CACHE_ALIAS", "default")]
+
+
+def cache_key(key):
+    """Ключ кэша по хэшу токена, чтобы сам токен не попадал в кэш."""
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def forget_token(key):
+    """Убрать токен из кэшей.
+
+    Общий кэш очищается сразу, кэши других процессов - по истечении
+    AUTH_TOKEN_LOCAL_TIMEOUT.
+    """
+    key = cache_key(key)
+    local_tokens.delete(key)
+    get_cache().delete(key)
+
+
+def forget_user_tokens(user):
+    for key in Token.objects.filter(user=user).values_list("key", flat=True):
+        forget_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену без запроса к базе на каждый запрос.
+
+    Токен с пользователем хранится в кэше процесса и в кэше Django.
+    Записи удаляются при выходе, смене пароля, деактивации пользователя
+    и удалении токена (api.signals); счётчики пользователя не кэшируются.
+
+    Изменяющие запросы читают токен и пользователя из базы: иначе
+    сохранение устаревшей копии пользователя из кэша вернуло бы пароль
+    или активность, изменённые в другом процессе.
+    """
+    cached = True
+
+    def authenticate(self, request):
+        self.cached = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def load_credentials(self, key):
+        try:
+            return super().authenticate_credentials(key)
+        except AuthenticationFailed:
+            if not reads_from_replica():
+                raise
+        # Только что выданный токен мог ещё не дойти до реплики.
+        with use_primary():
+            return super().authenticate_credentials(key)
+
+    def authenticate_credentials(self, key):
+        if not self.cached:
+            return self.load_credentials(key)
+        name = cache_key(key)
+        payload = local_tokens.get(name)
+        if payload is None:
+            payload = get_cache().get(name)
+            if payload is None:
+                user, token = self.load_credentials(key)
+                for field in UNCACHED_FIELDS:
+                    vars(user).pop(field, None)
+                payload = pickle.dumps(token)
+                get_cache().set(name, payload,
+                                token_setting("CACHE_TIMEOUT", 300))
+            local_tokens.set(name, payload,
+                             token_setting("LOCAL_TIMEOUT", 30))
+        # Каждый запрос получает свою копию пользователя.
+        token = pickle.loads(payload)
+        if not token.user.is_active:
+            raise AuthenticationFailed(_("User inactive or deleted."))
+        return token.user, token
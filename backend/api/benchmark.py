@@ -0,0 +1,425 @@
+import base64
+import io
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, reset_queries
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.feed import backfill
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer
+from api.similar_recipes import compute_all
+from recipes.counters import reconcile
+from recipes.shopping_lists import rebuild
+from recipes.models import (Carts, CountIngredient, Favourites, Ingredients,
+                            Recipes, Tags)
+from users.models import Subscribers
+
+User = get_user_model()
+
+PASSWORD = "benchmark-password"
+# Картинка 1x1 PNG для создания рецептов
+IMAGE = ("data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJ"
+         "AAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==")
+
+
+def seed(users=20, tags=6, ingredients=300, recipes=200,
+         ingredients_per_recipe=8, favorites=15, carts=10,
+         subscriptions=5, random_seed=0):
+    """Заполнить базу синтетическими данными, одинаковыми от запуска к
+    запуску при одном и том же random_seed."""
+    rng = random.Random(random_seed)
+    User.objects.bulk_create([
+        User(email=f"bench{i}@example.com", username=f"bench{i}",
+             first_name="Имя", last_name="Фамилия")
+        for i in range(users)
+    ])
+    user_list = list(User.objects.order_by("id"))
+    for user in user_list:
+        user.set_password(PASSWORD)
+    User.objects.bulk_update(user_list, ["password"])
+
+    Tags.objects.bulk_create([
+        Tags(name=f"Тег {i}", color=f"#{i:06x}", slug=f"tag{i}")
+        for i in range(tags)
+    ])
+    tag_list = list(Tags.objects.order_by("id"))
+    Ingredients.objects.bulk_create([
+        Ingredients(name=f"ингредиент {i:05d}", measurement_unit="г")
+        for i in range(ingredients)
+    ])
+    ingredient_list = list(Ingredients.objects.order_by("id"))
+
+    recipe_list = []
+    for i in range(recipes):
+        recipe = Recipes(author=rng.choice(user_list), name=f"Рецепт {i}",
+                         text="Описание рецепта. " * 20,
+                         image="recipes/benchmark.png",
+                         cooking_time=rng.randint(1, 300))
+        recipe.save()
+        recipe_list.append(recipe)
+    Recipes.tags.through.objects.bulk_create([
+        Recipes.tags.through(recipes_id=recipe.id, tags_id=tag.id)
+        for recipe in recipe_list
+        for tag in rng.sample(tag_list, rng.randint(1, min(3, tags)))
+    ])
+    CountIngredient.objects.bulk_create([
+        CountIngredient(recipe=recipe, ingredient=ingredient,
+                        amount=rng.randint(1, 500))
+        for recipe in recipe_list
+        for ingredient in rng.sample(
+            ingredient_list, min(ingredients_per_recipe, ingredients))
+    ])
+
+    for user in user_list:
+        Favourites.objects.bulk_create([
+            Favourites(user=user, recipe=recipe)
+            for recipe in rng.sample(recipe_list, min(favorites, recipes))
+        ])
+        Carts.objects.bulk_create([
+            Carts(user=user, recipe=recipe)
+            for recipe in rng.sample(recipe_list, min(carts, recipes))
+        ])
+        authors = rng.sample([other for other in user_list
+                              if other != user],
+                             min(subscriptions, users - 1))
+        Subscribers.objects.bulk_create([
+            Subscribers(user=user, author=author) for author in authors
+        ])
+        for author in authors:
+            backfill(user, author)
+    reconcile()
+    rebuild()
+    compute_all()
+    return user_list, tag_list, ingredient_list, recipe_list
+
+
+def endpoint(name, method, url, data=None, anonymous=False,
+             prepare=None, cleanup=None):
+    """Описание замера.
+
+    url может быть функцией, prepare и cleanup выполняются вне замера.
+    """
+    return {"name": name, "method": method, "url": url, "data": data,
+            "anonymous": anonymous, "prepare": prepare, "cleanup": cleanup}
+
+
+def endpoints(client, user, other, tag, ingredient, recipe, spare_recipe,
+              image):
+    """Все адреса api/urls.py.
+
+    Запись и удаление снабжены обратным действием, чтобы состояние базы
+    не менялось между повторами.
+    """
+    favorite = f"/api/recipes/{spare_recipe.id}/favorite/"
+    cart = f"/api/recipes/{spare_recipe.id}/shopping_cart/"
+    subscribe = f"/api/users/{other.id}/subscribe/"
+    cart_bulk = "/api/recipes/shopping_cart/bulk/"
+    not_in_cart = {"recipes": list(Recipes.objects.exclude(
+        cart__user=user).values_list("id", flat=True)[:20])}
+    recipe_data = {
+        "name": "Новый рецепт",
+        "text": "Описание",
+        "cooking_time": 30,
+        "image": image,
+        "tags": [tag.id],
+        "ingredients": [{"id": ingredient.id, "amount": 100}],
+    }
+
+    def delete_latest_recipe():
+        Recipes.objects.filter(author=user).latest("date").delete()
+
+    def create_recipe():
+        client.post("/api/recipes/", recipe_data, format="json")
+
+    def latest_recipe_url():
+        latest = Recipes.objects.filter(author=user).latest("date")
+        return f"/api/recipes/{latest.id}/"
+
+    return (
+        endpoint("tags list", "get", "/api/tags/", anonymous=True),
+        endpoint("tags detail", "get", f"/api/tags/{tag.id}/",
+                 anonymous=True),
+        endpoint("ingredients list", "get", "/api/ingredients/",
+                 anonymous=True),
+        endpoint("ingredients search", "get",
+                 "/api/ingredients/?name=ингр", anonymous=True),
+        endpoint("ingredients detail", "get",
+                 f"/api/ingredients/{ingredient.id}/", anonymous=True),
+        endpoint("recipes list anonymous", "get", "/api/recipes/",
+                 anonymous=True),
+        endpoint("recipes list", "get", "/api/recipes/?limit=50"),
+        endpoint("recipes list sparse", "get",
+                 "/api/recipes/?limit=50&fields=id,name,image,cooking_time"),
+        endpoint("recipes list deep page", "get",
+                 "/api/recipes/?page=3&limit=50"),
+        endpoint("recipes list by tag", "get",
+                 f"/api/recipes/?tags={tag.slug}&limit=50"),
+        endpoint("recipes favorited", "get",
+                 "/api/recipes/?is_favorited=1&limit=50"),
+        endpoint("recipes in cart", "get",
+                 "/api/recipes/?is_in_shopping_cart=1&limit=50"),
+        endpoint("recipes search", "get",
+                 "/api/recipes/?search=рецепт&limit=50"),
+        endpoint("recipes by ingredients", "get",
+                 f"/api/recipes/by-ingredients/?have={ingredient.id},"
+                 f"{ingredient.id + 1},{ingredient.id + 2}&limit=50"),
+        endpoint("recipes cursor", "get", "/api/recipes/?cursor=&limit=50"),
+        endpoint("recipes detail", "get", f"/api/recipes/{recipe.id}/"),
+        endpoint("recipes similar", "get",
+                 f"/api/recipes/{recipe.id}/similar/"),
+        endpoint("recipes feed", "get", "/api/recipes/feed/?limit=50"),
+        endpoint("recipes create", "post", "/api/recipes/", recipe_data,
+                 cleanup=delete_latest_recipe),
+        endpoint("recipes update", "patch", f"/api/recipes/{recipe.id}/",
+                 dict(recipe_data, name=recipe.name)),
+        endpoint("recipes delete", "delete", latest_recipe_url,
+                 prepare=create_recipe),
+        endpoint("shopping list", "get", "/api/recipes/shopping_list/"),
+        endpoint("shopping list txt", "get",
+                 "/api/recipes/download_shopping_cart/"),
+        endpoint("shopping list csv", "get",
+                 "/api/recipes/download_shopping_cart/?format=csv"),
+        endpoint("shopping list json", "get",
+                 "/api/recipes/download_shopping_cart/?format=json"),
+        endpoint("favorite add", "post", favorite,
+                 cleanup=lambda: client.delete(favorite)),
+        endpoint("favorite remove", "delete", favorite,
+                 prepare=lambda: client.post(favorite)),
+        endpoint("cart add", "post", cart,
+                 cleanup=lambda: client.delete(cart)),
+        endpoint("cart remove", "delete", cart,
+                 prepare=lambda: client.post(cart)),
+        endpoint("cart bulk add", "post", cart_bulk, not_in_cart,
+                 cleanup=lambda: client.delete(cart_bulk, not_in_cart,
+                                               format="json")),
+        endpoint("cart bulk remove", "delete", cart_bulk, not_in_cart,
+                 prepare=lambda: client.post(cart_bulk, not_in_cart,
+                                             format="json")),
+        endpoint("users list", "get", "/api/users/"),
+        endpoint("users detail", "get", f"/api/users/{other.id}/"),
+        endpoint("users me", "get", "/api/users/me/"),
+        endpoint("subscriptions", "get",
+                 "/api/users/subscriptions/?recipes_limit=3"),
+        endpoint("subscribe", "post", subscribe,
+                 cleanup=lambda: client.delete(subscribe)),
+        endpoint("unsubscribe", "delete", subscribe,
+                 prepare=lambda: client.post(subscribe)),
+        endpoint("token login", "post", "/api/auth/token/login/",
+                 {"email": user.email, "password": PASSWORD},
+                 anonymous=True),
+    )
+
+
+def content_length(response):
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+        response.close()
+        return size
+    return len(response.content)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(fraction * (len(values) - 1)))]
+
+
+def measure(client, spec, repeat):
+    timings, queries, size = [], [], 0
+    for _ in range(repeat + 1):
+        if spec["prepare"]:
+            spec["prepare"]()
+        url = spec["url"]() if callable(spec["url"]) else spec["url"]
+        call = getattr(client, spec["method"])
+        reset_queries()
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            if spec["data"] is None:
+                response = call(url)
+            else:
+                response = call(url, spec["data"], format="json")
+            size = content_length(response)
+            elapsed = time.perf_counter() - started
+        # Считаем до cleanup: следующий запрос клиента очищает журнал.
+        timings.append(elapsed * 1000)
+        queries.append(len(context.captured_queries))
+        if response.status_code >= 400:
+            raise RuntimeError(
+                f"{spec['method'].upper()} {url}: {response.status_code}")
+        if spec["cleanup"]:
+            spec["cleanup"]()
+    # Первый прогон прогревает кэши и индексы процесса.
+    timings, queries = timings[1:], queries[1:]
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+        "queries": max(queries),
+        "bytes": size,
+    }
+
+
+def run(repeat=20, **dataset):
+    """Прогнать все адреса API и вернуть метрики по каждому."""
+    for cache in caches.all():
+        cache.clear()
+    users, tags, ingredients, recipes = seed(**dataset)
+    user = users[0]
+    other = next(author for author in users[1:]
+                 if not Subscribers.objects.filter(
+                     user=user, author=author).exists())
+    spare_recipe = Recipes.objects.exclude(
+        favorites__user=user).exclude(cart__user=user).first()
+    recipe = Recipes.objects.filter(author=user).first() or recipes[0]
+
+    anonymous = APIClient()
+    authorized = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    authorized.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    results = {}
+    for spec in endpoints(authorized, user, other, tags[0], ingredients[0],
+                          recipe, spare_recipe, IMAGE):
+        client = anonymous if spec["anonymous"] else authorized
+        results[spec["name"]] = measure(client, spec, repeat)
+    return results
+
+
+def isolated(callback, interactive=True):
+    """Выполнить callback во временной базе и временном MEDIA_ROOT.
+
+    Копии картинок и соседи рецептов строятся синхронно: фоновые потоки
+    писали бы во временную базу параллельно с замерами.
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0,
+                                       autoclobber=not interactive)
+    try:
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root,
+                                   RECIPE_IMAGE_VARIANTS_SYNC=True,
+                                   SIMILAR_RECIPES_SYNC=True):
+                return callback()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def timed(func, repeat):
+    """Медиана времени вызова в мс и пик памяти одного вызова в КиБ."""
+    func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"median_ms": round(statistics.median(timings), 3),
+            "peak_kib": round(peak / 1024, 1)}
+
+
+def run_json(repeat=50, recipes=100, image_size=1024 * 1024,
+             random_seed=0):
+    """Сравнить стандартные JSONRenderer и JSONParser DRF с
+    FastJSONRenderer и FastJSONParser.
+
+    Рендерится страница из recipes рецептов, разбирается тело создания
+    рецепта с картинкой image_size байт в base64. Возвращает метрики и
+    признак совпадения вывода рендереров байт в байт.
+    """
+    for cache in caches.all():
+        cache.clear()
+    users, tags, ingredients, _ = seed(recipes=recipes,
+                                       random_seed=random_seed)
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=users[0])
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    page = client.get(f"/api/recipes/?limit={recipes}").data
+    image = os.urandom(image_size)
+    body = json.dumps({
+        "ingredients": [{"id": ingredient.id, "amount": 10}
+                        for ingredient in ingredients[:10]],
+        "tags": [tag.id for tag in tags[:2]],
+        "image": ("data:image/png;base64,"
+                  + base64.b64encode(image).decode()),
+        "name": "Рецепт для замера",
+        "text": "Описание рецепта. " * 20,
+        "cooking_time": 30,
+    }, ensure_ascii=False).encode()
+
+    def parse(parser):
+        return parser.parse(io.BytesIO(body),
+                            parser_context={"encoding": "utf-8"})
+
+    standard, fast = JSONRenderer(), FastJSONRenderer()
+    results = {
+        "render json": timed(lambda: standard.render(page), repeat),
+        "render fast": timed(lambda: fast.render(page), repeat),
+        "parse json": timed(lambda: parse(JSONParser()), repeat),
+        "parse fast": timed(lambda: parse(FastJSONParser()), repeat),
+    }
+    results["render json"]["bytes"] = len(standard.render(page))
+    results["render fast"]["bytes"] = len(fast.render(page))
+    results["parse json"]["bytes"] = results["parse fast"]["bytes"] = len(
+        body)
+    return results, standard.render(page) == fast.render(page)
+
+
+def compare(results, baseline, latency_threshold, size_threshold,
+            query_slack=0, latency_floor=10.0):
+    """Список регрессий относительно базовых значений.
+
+    Рост задержки меньше latency_floor миллисекунд считается шумом.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if metrics["queries"] > base["queries"] + query_slack:
+            regressions.append(
+                f"{name}: запросов {metrics['queries']} "
+                f"вместо {base['queries']}")
+        if (metrics["p95_ms"] > base["p95_ms"] * (1 + latency_threshold)
+                and metrics["p95_ms"] - base["p95_ms"] > latency_floor):
+            regressions.append(
+                f"{name}: p95 {metrics['p95_ms']} мс "
+                f"вместо {base['p95_ms']} мс")
+        if metrics["bytes"] > base["bytes"] * (1 + size_threshold):
+            regressions.append(
+                f"{name}: ответ {metrics['bytes']} байт "
+                f"вместо {base['bytes']} байт")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)["endpoints"]
+
+
+def dump_baseline(path, results, dataset, repeat):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(
+            {"dataset": dataset, "repeat": repeat, "endpoints": results},
+            file, ensure_ascii=False, indent=2, sort_keys=True,
+        )
+        file.write("\n")
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Кэши процесса: версии, журналы и отзыв токенов в них не видны
+# другим процессам и командам manage.py
+LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+# Настройки с именами кэшей, общих для всех процессов
+SHARED_ALIASES = (
+    "MEMBERSHIP_CACHE_ALIAS",
+    "RESPONSE_CACHE_ALIAS",
+    "RECIPE_FRAGMENT_CACHE_ALIAS",
+    "REPLICA_STICKY_CACHE_ALIAS",
+    "AUTH_TOKEN_CACHE_ALIAS",
+)
+
+
+@register(Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    """Без DEBUG кэши из SHARED_ALIASES и default должны быть общими."""
+    if settings.DEBUG:
+        return []
+    aliases = {"default"} | {getattr(settings, name, "default")
+                             for name in SHARED_ALIASES}
+    return [
+        Warning(
+            f"Кэш {alias!r} работает только внутри процесса.",
+            hint=("Задайте общий кэш (CACHE_BACKEND, CACHE_LOCATION), "
+                  "например memcached: иначе изменения из других "
+                  "процессов и команд не видны."),
+            id="api.W001",
+        )
+        for alias in sorted(aliases)
+        if settings.CACHES.get(alias, {}).get("BACKEND") in LOCAL_BACKENDS
+    ]
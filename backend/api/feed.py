@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Q
+
+from recipes.models import Feeds, Recipes
+from users.models import Subscribers
+
+# Рецепт сохраняется с датой до фиксации транзакции: забирая новые
+# рецепты, пересматриваем и чуть более ранние
+PULL_OVERLAP = timedelta(minutes=1)
+
+
+def fanout_limit():
+    return getattr(settings, "FEED_FANOUT_LIMIT", 1000)
+
+
+def backfill_size():
+    return getattr(settings, "FEED_BACKFILL_SIZE", 20)
+
+
+def fan_out(recipe):
+    """Разложить новый рецепт по лентам подписчиков автора.
+
+    Рецепты авторов с большим числом подписчиков не раскладываются:
+    их подписчики забирают такие рецепты сами при чтении ленты.
+    """
+    if recipe.author_id is None:
+        return
+    # Число подписчиков берётся из базы, а не из объекта автора: у
+    # пользователя из кэша токенов оно могло устареть.
+    followers = Subscribers.objects.filter(
+        author_id=recipe.author_id,
+        author__subscribers_count__lte=fanout_limit(),
+    ).values_list("user_id", flat=True)
+    Feeds.objects.bulk_create(
+        [Feeds(user_id=user_id, recipe=recipe, date=recipe.date)
+         for user_id in followers.iterator()],
+        ignore_conflicts=True,
+    )
+
+
+def add_recipes(user, recipes):
+    Feeds.objects.bulk_create(
+        [Feeds(user=user, recipe_id=recipe_id, date=date)
+         for recipe_id, date in recipes.values_list("id", "date")],
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user, author):
+    """Добавить в ленту последние рецепты нового автора из подписок."""
+    add_recipes(
+        user,
+        Recipes.objects.filter(author=author).order_by("-date")[
+            :backfill_size()
+        ],
+    )
+
+
+def forget(user, author):
+    """Убрать из ленты рецепты автора после отписки."""
+    Feeds.objects.filter(user=user, recipe__author=author).delete()
+
+
+def pull_popular(user):
+    """Забрать в ленту рецепты популярных авторов (fan-out при чтении).
+
+    Отметка своя у каждого автора - его самый новый рецепт, уже лежащий
+    в ленте (после подписки его кладёт backfill). Забираются только
+    рецепты новее неё, так что чтение без новых рецептов ничего не
+    пишет, а подписка на нового автора не сдвигает отметки остальных.
+    """
+    authors = list(Subscribers.objects.filter(
+        user=user,
+        author__subscribers_count__gt=fanout_limit(),
+    ).values_list("author_id", flat=True))
+    if not authors:
+        return
+    latest = dict(Feeds.objects.filter(
+        user=user, recipe__author__in=authors
+    ).order_by().values("recipe__author").annotate(
+        latest=Max("date")
+    ).values_list("recipe__author", "latest"))
+    condition = Q()
+    for author_id in authors:
+        if author_id in latest:
+            condition |= Q(author_id=author_id,
+                           date__gt=latest[author_id] - PULL_OVERLAP)
+        else:
+            condition |= Q(author_id=author_id)
+    recipes = Recipes.objects.filter(condition).exclude(feeds__user=user)
+    add_recipes(
+        user,
+        recipes.order_by("-date")[:backfill_size() * len(authors)],
+    )
@@ -1,19 +1,13 @@
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredients, Recipes, Tags
+from api.membership import get_membership
+from recipes.models import Recipes, Tags
+from recipes.search import search_recipes
 
 User = get_user_model()
 
 
-class IngredientsFilter(FilterSet):
-    name = filters.CharFilter(lookup_expr="startswith")
-
-    class Meta:
-        model = Ingredients
-        fields = ("name",)
-
-
 class RecipesFilter(FilterSet):
 
     author = filters.NumberFilter(field_name="author")
@@ -27,21 +21,28 @@ class RecipesFilter(FilterSet):
         method="filter_is_favorited")
     is_in_shopping_cart = filters.BooleanFilter(
         method="filter_is_in_shopping_cart")
+    search = filters.CharFilter(method="filter_search")
 
     class Meta:
         model = Recipes
-        fields = ("tags", "author", "is_favorited", "is_in_shopping_cart")
+        fields = ("tags", "author", "is_favorited", "is_in_shopping_cart",
+                  "search")
 
     def filter_is_favorited(self, queryset, name, value):
         if not self.request.user.is_authenticated:
             return queryset
+        favorites = get_membership(self.request).favorites
         if value:
-            return queryset.filter(favorites__user=self.request.user)
-        return queryset.exclude(favorites__user=self.request.user)
+            return queryset.filter(id__in=favorites)
+        return queryset.exclude(id__in=favorites)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if not self.request.user.is_authenticated:
             return queryset
+        cart = get_membership(self.request).cart
         if value:
-            return queryset.filter(cart__user=self.request.user)
-        return queryset.exclude(cart__user=self.request.user)
+            return queryset.filter(id__in=cart)
+        return queryset.exclude(id__in=cart)
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
@@ -0,0 +1,169 @@
+import base64
+import binascii
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import close_old_connections, transaction
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, ImageOps
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import ImageField
+
+from api.response_cache import invalidate
+from recipes.models import Recipes
+
+# Имя варианта -> наибольшая сторона в пикселях
+DEFAULT_VARIANTS = {
+    "thumbnail": 160,
+    "card": 480,
+    "full": 1200,
+}
+FORMATS = (
+    ("webp", "WEBP", {"quality": 80, "method": 4}),
+    ("jpeg", "JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+)
+
+logger = logging.getLogger(__name__)
+_executor = None
+
+
+def image_setting(name, default):
+    return getattr(settings, f"RECIPE_IMAGE_{name}", default)
+
+
+class RecipeImageField(Base64ImageField):
+    """Картинка рецепта в base64 с ограничением размера.
+
+    Размер проверяется до декодирования, размеры в пикселях - по
+    заголовку файла, так что большие загрузки отклоняются до разбора
+    картинки. В памяти остаются строка запроса, копия base64 без
+    заголовка data: (на время декодирования) и декодированный файл.
+    """
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise ValidationError("Картинка должна быть строкой base64.")
+
+        max_size = image_setting("MAX_SIZE", 5 * 1024 * 1024)
+        if len(base64_data) > max_size * 4 // 3 + 256:
+            raise ValidationError("Картинка слишком большая!")
+        _, _, payload = base64_data.rpartition(";base64,")
+        try:
+            decoded_file = base64.b64decode(payload, validate=True)
+        except (TypeError, binascii.Error, ValueError):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        del payload
+
+        try:
+            with Image.open(io.BytesIO(decoded_file)) as image:
+                width, height = image.size
+        except (OSError, Image.DecompressionBombError):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        if width * height > image_setting("MAX_PIXELS", 40_000_000):
+            raise ValidationError("Слишком большое разрешение картинки!")
+
+        file_name = self.get_file_name(decoded_file)
+        file_extension = self.get_file_extension(file_name, decoded_file)
+        if file_extension not in self.ALLOWED_TYPES:
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        return ImageField.to_internal_value(self, SimpleUploadedFile(
+            name=f"{file_name}.{file_extension}",
+            content=decoded_file,
+        ))
+
+
+def variant_name(image_name, variant, extension):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f"recipes/variants/{stem}_{variant}.{extension}"
+
+
+def variant_names(image_name):
+    return [variant_name(image_name, variant, extension)
+            for variant in image_setting("VARIANTS", DEFAULT_VARIANTS)
+            for extension, _, _ in FORMATS]
+
+
+def delete_variants(image_name):
+    """Удалить копии картинки из хранилища."""
+    for name in variant_names(image_name):
+        default_storage.delete(name)
+
+
+def schedule_cleanup(image_name):
+    """Удалить копии прежней картинки после фиксации транзакции."""
+    if image_name:
+        transaction.on_commit(lambda: delete_variants(image_name))
+
+
+def render_variants(recipe_id):
+    """Построить уменьшенные копии картинки рецепта в WebP и JPEG."""
+    recipe = Recipes.objects.filter(pk=recipe_id).only("image").first()
+    if recipe is None or not recipe.image:
+        return None
+    image_name = recipe.image.name
+    variants = {}
+    with recipe.image.open("rb") as file, Image.open(file) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ("RGB", "L"):
+            source = source.convert("RGB")
+        sizes = image_setting("VARIANTS", DEFAULT_VARIANTS)
+        for variant, size in sorted(sizes.items(), key=lambda item: -item[1]):
+            image = source.copy()
+            image.thumbnail((size, size))
+            urls = {"width": image.width}
+            for extension, image_format, options in FORMATS:
+                buffer = io.BytesIO()
+                image.save(buffer, image_format, **options)
+                name = variant_name(image_name, variant, extension)
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+                urls[extension] = default_storage.url(
+                    default_storage.save(name, ContentFile(buffer.getvalue()))
+                )
+            variants[variant] = urls
+    updated = Recipes.objects.filter(
+        pk=recipe_id, image=image_name
+    ).update(image_variants=variants)
+    if not updated:
+        # Картинку успели заменить или рецепт удалили: копии не нужны
+        delete_variants(image_name)
+        return None
+    invalidate("recipes", f"recipe:{recipe_id}")
+    return variants
+
+
+def run_job(recipe_id):
+    try:
+        render_variants(recipe_id)
+    except Exception:
+        logger.exception("Не удалось построить копии картинки рецепта %s",
+                         recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(recipe):
+    """Поставить построение копий в очередь после фиксации транзакции."""
+    recipe_id = recipe.pk
+
+    def submit():
+        global _executor
+        if image_setting("VARIANTS_SYNC", False):
+            render_variants(recipe_id)
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=image_setting("WORKERS", 2),
+                thread_name_prefix="recipe-images",
+            )
+        _executor.submit(run_job, recipe_id)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,124 @@
+import threading
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from recipes.models import Ingredients
+
+INDEX_VERSION_KEY = "ingredients:version"
+FUZZY_THRESHOLD = 0.3
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def normalize(text):
+    return text.casefold().replace("ё", "е").strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса.
+
+    Отсортированный массив имён отвечает на поиск по началу строки,
+    триграммы - на поиск по вхождению и нечёткий поиск.
+    """
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (normalize(row["name"]),
+                                             row["id"]))
+        self.rows = rows
+        self.keys = [normalize(row["name"]) for row in rows]
+        self.postings = defaultdict(list)
+        for position, key in enumerate(self.keys):
+            for trigram in trigrams(key):
+                self.postings[trigram].append(position)
+
+    def prefix(self, query):
+        """Позиции имён, начинающихся с query."""
+        start = bisect_left(self.keys, query)
+        end = start
+        while end < len(self.keys) and self.keys[end].startswith(query):
+            end += 1
+        return range(start, end)
+
+    def contains(self, query):
+        """Позиции имён, содержащих query."""
+        if len(query) < 3:
+            return [position for position, key in enumerate(self.keys)
+                    if query in key]
+        inner = {query[i:i + 3] for i in range(len(query) - 2)}
+        lists = sorted((self.postings.get(trigram, []) for trigram in inner),
+                       key=len)
+        candidates = set(lists[0])
+        for positions in lists[1:]:
+            candidates.intersection_update(positions)
+            if not candidates:
+                break
+        return sorted(position for position in candidates
+                      if query in self.keys[position])
+
+    def fuzzy(self, query):
+        """Позиции похожих имён по доле общих триграмм."""
+        query_trigrams = trigrams(query)
+        shared = defaultdict(int)
+        for trigram in query_trigrams:
+            for position in self.postings.get(trigram, ()):
+                shared[position] += 1
+        scored = []
+        for position, count in shared.items():
+            total = len(query_trigrams | trigrams(self.keys[position]))
+            similarity = count / total
+            if similarity >= FUZZY_THRESHOLD:
+                scored.append((-similarity, position))
+        return [position for _, position in sorted(scored)]
+
+    def search(self, query):
+        """Сначала совпадения по началу, затем по вхождению.
+
+        Если точных совпадений нет, возвращаются похожие имена.
+        """
+        query = normalize(query)
+        if not query:
+            return list(self.rows)
+        positions = list(self.prefix(query))
+        seen = set(positions)
+        positions.extend(position for position in self.contains(query)
+                         if position not in seen)
+        if not positions:
+            positions = self.fuzzy(query)
+        return [self.rows[position] for position in positions]
+
+
+def get_index_version():
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(INDEX_VERSION_KEY)
+    return version
+
+
+def bump_index_version():
+    cache.set(INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def get_ingredient_index():
+    """Индекс процесса; перестраивается при смене версии в общем кэше."""
+    global _index, _index_version
+    version = get_index_version()
+    if _index is not None and _index_version == version:
+        return _index
+    with _lock:
+        if _index is None or _index_version != version:
+            _index = IngredientIndex(
+                Ingredients.objects.values("id", "name", "measurement_unit")
+            )
+            _index_version = version
+    return _index
@@ -0,0 +1,163 @@
+import random
+import threading
+from collections import defaultdict
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import CountIngredient
+
+# Номер последнего изменения и журнал лежат в кэше Django: он должен
+# быть общим для всех процессов (см. CACHES в настройках), иначе каждый
+# процесс видит только свои изменения.
+SEQUENCE_KEY = "ingredient-recipes:sequence"
+CHANGE_KEY = "ingredient-recipes:change:{}"
+# Сколько изменений процесс догоняет по журналу, а не перестройкой
+MAX_REPLAY = 1000
+CHANGE_TIMEOUT = 24 * 60 * 60
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+_lock = threading.Lock()
+_index = None
+
+
+def load_ingredients(recipe_ids=None):
+    """Множества id ингредиентов рецептов из CountIngredient."""
+    rows = CountIngredient.objects.all()
+    if recipe_ids is not None:
+        rows = rows.filter(recipe_id__in=recipe_ids)
+    ingredients = defaultdict(set)
+    for recipe_id, ingredient_id in rows.values_list(
+        "recipe_id", "ingredient_id"
+    ).iterator(chunk_size=5000):
+        ingredients[recipe_id].add(ingredient_id)
+    return ingredients
+
+
+class IngredientRecipesIndex:
+    """Обратный индекс: id ингредиента -> отсортированный массив id
+    рецептов.
+
+    Рецепты считаются одним проходом NumPy по спискам выбранных
+    ингредиентов, без GROUP BY по всей таблице ингредиентов рецептов.
+    """
+
+    def __init__(self, ingredients, sequence):
+        self.sequence = sequence
+        self.recipes = {recipe_id: frozenset(ids)
+                        for recipe_id, ids in ingredients.items()}
+        postings = defaultdict(list)
+        for recipe_id, ids in self.recipes.items():
+            for ingredient_id in ids:
+                postings[ingredient_id].append(recipe_id)
+        self.postings = {
+            ingredient_id: np.array(sorted(recipe_ids), dtype=np.int64)
+            for ingredient_id, recipe_ids in postings.items()
+        }
+
+    def copy(self):
+        """Копия для изменения: массивы не меняются на месте, поэтому
+        достаточно копировать словари."""
+        index = object.__new__(IngredientRecipesIndex)
+        index.sequence = self.sequence
+        index.recipes = dict(self.recipes)
+        index.postings = dict(self.postings)
+        return index
+
+    def update(self, recipe_id, ingredient_ids):
+        """Заменить ингредиенты рецепта; пустое множество удаляет его."""
+        old = self.recipes.pop(recipe_id, frozenset())
+        new = frozenset(ingredient_ids)
+        if new:
+            self.recipes[recipe_id] = new
+        for ingredient_id in old - new:
+            postings = self.postings[ingredient_id]
+            postings = np.delete(
+                postings, np.searchsorted(postings, recipe_id))
+            if postings.size:
+                self.postings[ingredient_id] = postings
+            else:
+                del self.postings[ingredient_id]
+        for ingredient_id in new - old:
+            postings = self.postings.get(ingredient_id, EMPTY)
+            self.postings[ingredient_id] = np.insert(
+                postings, np.searchsorted(postings, recipe_id), recipe_id)
+
+    def rank(self, ingredient_ids):
+        """Рецепты, где есть хоть один из ингредиентов.
+
+        Возвращает массивы id рецептов, числа совпавших и недостающих
+        ингредиентов; сначала больше совпадений, затем меньше нехватки.
+        """
+        lists = [self.postings[ingredient_id]
+                 for ingredient_id in set(ingredient_ids)
+                 if ingredient_id in self.postings]
+        if not lists:
+            return EMPTY, EMPTY, EMPTY
+        recipe_ids, matched = np.unique(np.concatenate(lists),
+                                        return_counts=True)
+        sizes = np.fromiter((len(self.recipes[recipe_id])
+                             for recipe_id in recipe_ids.tolist()),
+                            dtype=np.int64, count=recipe_ids.size)
+        missing = sizes - matched
+        order = np.lexsort((-recipe_ids, missing, -matched))
+        return recipe_ids[order], matched[order], missing[order]
+
+
+def get_sequence():
+    sequence = cache.get(SEQUENCE_KEY)
+    if sequence is None:
+        # После сброса кэша номера начинаются со случайного: индекс,
+        # построенный до сброса, не совпадёт с новыми номерами.
+        cache.add(SEQUENCE_KEY, random.getrandbits(48), None)
+        sequence = cache.get(SEQUENCE_KEY)
+    return sequence
+
+
+def publish(recipe_id):
+    """Записать изменение рецепта в журнал для всех процессов."""
+    get_sequence()
+    sequence = cache.incr(SEQUENCE_KEY)
+    cache.set(CHANGE_KEY.format(sequence), recipe_id, CHANGE_TIMEOUT)
+
+
+def recipe_changed(recipe_id):
+    # Второй раз после фиксации: процесс, догнавший журнал до неё,
+    # перечитает рецепт уже с новыми ингредиентами.
+    publish(recipe_id)
+    transaction.on_commit(lambda: publish(recipe_id))
+
+
+def replay(index, sequence):
+    """Догнать журнал изменений; None, если его не хватает."""
+    if not 0 < sequence - index.sequence <= MAX_REPLAY:
+        return None
+    keys = [CHANGE_KEY.format(number)
+            for number in range(index.sequence + 1, sequence + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return None
+    recipe_ids = set(changes.values())
+    ingredients = load_ingredients(recipe_ids)
+    # Запросы других потоков продолжают читать прежний индекс.
+    index = index.copy()
+    for recipe_id in recipe_ids:
+        index.update(recipe_id, ingredients.get(recipe_id, ()))
+    index.sequence = sequence
+    return index
+
+
+def get_ingredient_recipes_index():
+    """Индекс процесса, догоняющий журнал изменений рецептов."""
+    global _index
+    sequence = get_sequence()
+    if _index is not None and _index.sequence == sequence:
+        return _index
+    with _lock:
+        if _index is not None and _index.sequence != sequence:
+            _index = replay(_index, sequence)
+        if _index is None:
+            _index = IngredientRecipesIndex(load_ingredients(), sequence)
+    return _index
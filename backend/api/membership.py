@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from recipes.models import Carts, Favourites
+from users.models import Subscribers
+
+MEMBERSHIP_KEY = "membership:{}"
+
+
+class Membership:
+    """Избранное, корзина и подписки пользователя в виде множеств id."""
+
+    __slots__ = ("favorites", "cart", "subscriptions")
+
+    def __init__(self, favorites=(), cart=(), subscriptions=()):
+        self.favorites = frozenset(favorites)
+        self.cart = frozenset(cart)
+        self.subscriptions = frozenset(subscriptions)
+
+    def dump(self):
+        """Компактное представление для хранения в кэше."""
+        return (
+            tuple(sorted(self.favorites)),
+            tuple(sorted(self.cart)),
+            tuple(sorted(self.subscriptions)),
+        )
+
+
+EMPTY_MEMBERSHIP = Membership()
+
+
+def get_cache():
+    return caches[getattr(settings, "MEMBERSHIP_CACHE_ALIAS", "default")]
+
+
+def load_membership(user):
+    """Прочитать множества пользователя из базы."""
+    return Membership(
+        favorites=Favourites.objects.filter(
+            user=user).values_list("recipe_id", flat=True),
+        cart=Carts.objects.filter(
+            user=user).values_list("recipe_id", flat=True),
+        subscriptions=Subscribers.objects.filter(
+            user=user).values_list("author_id", flat=True),
+    )
+
+
+def get_membership(request):
+    """Множества текущего пользователя, загруженные один раз на запрос."""
+    if request is None or request.user.is_anonymous:
+        return EMPTY_MEMBERSHIP
+    http_request = getattr(request, "_request", request)
+    membership = getattr(http_request, "_membership", None)
+    if membership is not None:
+        return membership
+
+    cache = get_cache()
+    key = MEMBERSHIP_KEY.format(request.user.pk)
+    cached = cache.get(key)
+    if cached is not None:
+        membership = Membership(*cached)
+    else:
+        membership = load_membership(request.user)
+        cache.set(
+            key,
+            membership.dump(),
+            getattr(settings, "MEMBERSHIP_CACHE_TIMEOUT", 300),
+        )
+    http_request._membership = membership
+    return membership
+
+
+def forget_membership(user_id):
+    """Сбросить множества пользователя в кэше.
+
+    Ключ удаляется сразу и ещё раз после фиксации транзакции: иначе
+    параллельный запрос мог бы между удалением и фиксацией снова
+    сохранить в кэш старые множества.
+    """
+    key = MEMBERSHIP_KEY.format(user_id)
+    get_cache().delete(key)
+    transaction.on_commit(lambda: get_cache().delete(key))
+
+
+def update_membership(request, field, object_id, present):
+    """Отразить запись в избранное, корзину или подписки.
+
+    Копия запроса обновляется на месте, а общий кэш сбрасывается, чтобы
+    параллельные запросы одного пользователя не затирали друг друга.
+    """
+    update_membership_many(request, field, {object_id}, present)
+
+
+def update_membership_many(request, field, object_ids, present):
+    """То же для нескольких id сразу."""
+    http_request = getattr(request, "_request", request)
+    membership = getattr(http_request, "_membership", None)
+    if membership is not None:
+        ids = getattr(membership, field)
+        setattr(
+            membership,
+            field,
+            ids | set(object_ids) if present else ids - set(object_ids),
+        )
+    forget_membership(request.user.pk)
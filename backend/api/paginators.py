@@ -1,7 +1,179 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
 
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-class LimitPagination(PageNumberPagination):
-    """Пагинатор."""
+
+def descending(field):
+    return field.startswith("-")
+
+
+def flipped(field):
+    return field[1:] if descending(field) else f"-{field}"
+
+
+class KeysetPagination(BasePagination):
+    """Пагинатор по ключу без OFFSET и COUNT(*).
+
+    Курсор хранит значения всех полей ordering у последней (или, для
+    ссылки назад, первой) строки страницы; следующая страница - строки
+    после этого ключа: для ("-date", "-id") это
+    Q(date__lt=d) | Q(date=d, id__lt=i). Последнее поле порядка должно
+    быть уникальным, иначе к нему добавляется id.
+    """
+    cursor_query_param = "cursor"
+    page_size_query_param = "limit"
+    page_size = 6
+    ordering = ("-date", "-id")
+    invalid_cursor_message = "Неверный курсор."
+
+    def get_ordering(self):
+        ordering = ((self.ordering,) if isinstance(self.ordering, str)
+                    else tuple(self.ordering))
+        if ordering[-1].lstrip("-") not in ("id", "pk"):
+            ordering += ("-id" if descending(ordering[0]) else "id",)
+        return ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return size if size > 0 else self.page_size
+
+    def encode_cursor(self, values, reverse):
+        values = [value.isoformat() if hasattr(value, "isoformat")
+                  else value for value in values]
+        return base64.urlsafe_b64encode(
+            json.dumps([values, reverse]).encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            values, reverse = json.loads(base64.urlsafe_b64decode(
+                cursor.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(values, list)
+                or len(values) != len(self.get_ordering())):
+            raise NotFound(self.invalid_cursor_message)
+        return values, bool(reverse)
+
+    def after(self, ordering, values):
+        """Строки после ключа values в порядке ordering."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if descending(field) else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    def key(self, item):
+        return [getattr(item, field.lstrip("-"))
+                for field in self.get_ordering()]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[1]
+        ordering = self.get_ordering()
+        if reverse:
+            ordering = tuple(map(flipped, ordering))
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            try:
+                queryset = queryset.filter(self.after(ordering, cursor[0]))
+            except (TypeError, ValueError, DjangoValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        page = list(queryset[:size + 1])
+        more = len(page) > size
+        page = page[:size]
+        if reverse:
+            page.reverse()
+        self.has_next = more or reverse
+        self.has_previous = more if reverse else cursor is not None
+        self.page = page
+        return page
+
+    def link(self, item, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param,
+            self.encode_cursor(self.key(item), reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.link(self.page[-1], False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(),
+                                      self.cursor_query_param)
+        return self.link(self.page[0], True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+
+class PagePagination(PageNumberPagination):
+    """Постраничный пагинатор (?page=&limit=); годится и для списков."""
     page_size_query_param = "limit"
     page_size = 6
+
+
+class LimitPagination(PagePagination):
+    """Пагинатор.
+
+    По умолчанию постраничный (?page=&limit=). С параметром ?cursor=
+    (можно пустым для первой страницы) переключается на пагинацию по
+    ключу, порядок которой задаёт атрибут представления cursor_ordering.
+    С параметрами из cursor_excluded_params (поиск упорядочивает
+    по релевантности) курсор не принимается.
+    """
+    cursor_query_param = "cursor"
+    cursor_excluded_params = ("search",)
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.keyset = None
+            return super().paginate_queryset(queryset, request, view)
+        excluded = [param for param in self.cursor_excluded_params
+                    if param in request.query_params]
+        if excluded:
+            raise ValidationError({self.cursor_query_param: (
+                f"Курсор нельзя сочетать с {', '.join(excluded)}, "
+                f"используйте ?page=.")})
+        self.keyset = KeysetPagination()
+        self.keyset.ordering = getattr(
+            view, "cursor_ordering", KeysetPagination.ordering
+        )
+        return self.keyset.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(KeysetPagination):
+    """Пагинатор ленты по курсору."""
+    ordering = "-date"
@@ -0,0 +1,230 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.serializers import ListSerializer, Serializer
+
+logger = logging.getLogger(__name__)
+_current = ContextVar("request_profile", default=None)
+
+IN_LIST = re.compile(r"\bIN \((?:%s, )*%s\)")
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+# Сколько повторяющихся запросов попадает в строку лога
+DUPLICATES_IN_LOG = 5
+
+
+def fingerprint(sql):
+    """SQL без значений: один и тот же запрос с разными параметрами
+    даёт одинаковый отпечаток."""
+    sql = IN_LIST.sub("IN (...)", sql)
+    sql = LITERAL.sub("?", sql)
+    return " ".join(sql.split())
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 2)
+
+
+class Profile:
+    """Запросы к базе и время этапов одного HTTP-запроса.
+
+    Экземпляр служит и обёрткой execute для всех подключений к базе.
+    Время этапов считается без времени запросов к базе внутри них.
+    """
+
+    def __init__(self):
+        self.label = None
+        self.queries = Counter()
+        self.db_time = 0.0
+        self.spans = Counter()
+        self.running = {}
+        self.started = time.perf_counter()
+        self.total = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries[fingerprint(sql)] += 1
+
+    def start(self, name):
+        self.running[name] = (time.perf_counter(), self.db_time)
+
+    def stop(self, name):
+        started, db_time = self.running.pop(name)
+        self.spans[name] += (time.perf_counter() - started
+                             - (self.db_time - db_time))
+
+    @contextmanager
+    def span(self, name):
+        # Вложенные этапы с тем же именем уже учтены внешним.
+        if name in self.running:
+            yield
+            return
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.queries.most_common()
+                if count > 1}
+
+    def server_timing(self):
+        count = sum(self.queries.values())
+        metrics = [
+            f'db;dur={milliseconds(self.db_time)};desc="{count} queries, '
+            f'{len(self.duplicates)} duplicated"',
+        ]
+        metrics.extend(f"{name};dur={milliseconds(seconds)}"
+                       for name, seconds in self.spans.items())
+        metrics.append(f"total;dur={milliseconds(self.total)}")
+        return ", ".join(metrics)
+
+    def log_line(self, request, response):
+        duplicates = self.duplicates
+        record = {
+            "endpoint": self.label,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": milliseconds(self.total),
+            "db_ms": milliseconds(self.db_time),
+            "queries": sum(self.queries.values()),
+            "duplicated": len(duplicates),
+            "duplicates": dict(list(duplicates.items())[:DUPLICATES_IN_LOG]),
+        }
+        for name, seconds in self.spans.items():
+            record[f"{name}_ms"] = milliseconds(seconds)
+        return json.dumps(record, ensure_ascii=False)
+
+
+@contextmanager
+def span(name):
+    """Замер этапа текущего запроса; без профилирования ничего не делает."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    with profile.span(name):
+        yield
+
+
+def view_label(request, view_func):
+    """Имя обработчика: RecipeViewSet.list, UserViewSet.subscriptions."""
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return getattr(view_func, "__qualname__", repr(view_func))
+    method = request.method.lower()
+    actions = getattr(view_func, "actions", None) or {}
+    return f"{view_class.__name__}.{actions.get(method, method)}"
+
+
+class SerializerPatch:
+    """Подмена Serializer.data и ListSerializer.data на время
+    профилируемых запросов.
+
+    Запросы могут идти в нескольких потоках: подмена ставится первым
+    вошедшим и снимается последним вышедшим, в том числе при ошибке.
+    """
+    classes = (Serializer, ListSerializer)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+        self.originals = {}
+
+    def patch(self):
+        for serializer_class in self.classes:
+            original = serializer_class.__dict__["data"]
+            self.originals[serializer_class] = original
+
+            def data(self, getter=original.fget):
+                with span("serialize"):
+                    return getter(self)
+
+            serializer_class.data = property(data)
+
+    def restore(self):
+        for serializer_class, original in self.originals.items():
+            serializer_class.data = original
+        self.originals.clear()
+
+    def __enter__(self):
+        with self.lock:
+            if not self.users:
+                self.patch()
+            self.users += 1
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.users -= 1
+            if not self.users:
+                self.restore()
+
+
+serializer_patch = SerializerPatch()
+
+
+def profile_serializers():
+    """Учитывать чтение serializer.data как этап serialize внутри
+    блока with."""
+    return serializer_patch
+
+
+class RequestProfilingMiddleware:
+    """Число и время запросов к базе, повторяющиеся запросы и время
+    сериализации и рендеринга в заголовке Server-Timing и в логе.
+
+    Включается настройкой REQUEST_PROFILING. Запросы, которые выполняет
+    потоковый ответ при отдаче тела, не учитываются.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_PROFILING", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = Profile()
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                stack.enter_context(profile_serializers())
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        profile.finish()
+        response["Server-Timing"] = profile.server_timing()
+        logger.info(profile.log_line(request, response))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current.get()
+        if profile is not None:
+            profile.label = view_label(request, view_func)
+
+    def process_template_response(self, request, response):
+        profile = _current.get()
+        if profile is not None:
+            profile.start("render")
+            response.add_post_render_callback(
+                lambda rendered: profile.stop("render"))
+        return response
@@ -0,0 +1,119 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.serializers import ListSerializer
+
+from api.membership import get_membership
+from api.response_cache import recipe_tags, tag_versions
+from recipes.models import Recipes
+
+FRAGMENT_KEY = "recipe-fragment:{}"
+# Поля, которые зависят от зрителя и в фрагмент не попадают
+VIEWER_FIELDS = ("is_favorited", "is_in_shopping_cart")
+# Фрагмент устаревает и при смене справочника ингредиентов
+FRAGMENT_TAGS = ("ingredients",)
+
+
+def get_cache():
+    return caches[getattr(settings, "RECIPE_FRAGMENT_CACHE_ALIAS",
+                          "default")]
+
+
+def fragment_tags(fragment):
+    return recipe_tags(fragment) | set(FRAGMENT_TAGS)
+
+
+def get_fragments(recipe_ids):
+    """Актуальные фрагменты рецептов: {id: данные}.
+
+    Два обращения к кэшу на любое число рецептов: сами фрагменты и
+    версии их тегов (api.response_cache).
+    """
+    entries = get_cache().get_many(
+        [FRAGMENT_KEY.format(recipe_id) for recipe_id in recipe_ids]
+    )
+    versions = tag_versions({tag for entry in entries.values()
+                             for tag in entry["versions"]})
+    return {
+        entry["data"]["id"]: entry["data"]
+        for entry in entries.values()
+        if all(versions.get(tag) == version
+               for tag, version in entry["versions"].items())
+    }
+
+
+def known_versions(recipe_ids):
+    """Версии тегов, известных до выборки рецептов: их нужно прочитать
+    раньше неё, чтобы изменение, зафиксированное во время сборки,
+    не осталось незамеченным."""
+    return tag_versions({f"recipe:{recipe_id}" for recipe_id in recipe_ids}
+                        | set(FRAGMENT_TAGS), create=True)
+
+
+def store_fragments(fragments, known=None):
+    known = known or {}
+    versions = tag_versions({tag for fragment in fragments
+                             for tag in fragment_tags(fragment)}
+                            - known.keys(), create=True)
+    versions.update(known)
+    get_cache().set_many(
+        {
+            FRAGMENT_KEY.format(fragment["id"]): {
+                "data": fragment,
+                "versions": {tag: versions[tag]
+                             for tag in fragment_tags(fragment)},
+            }
+            for fragment in fragments
+        },
+        getattr(settings, "RECIPE_FRAGMENT_TIMEOUT", 60 * 60),
+    )
+
+
+class RecipeFragmentListSerializer(ListSerializer):
+    """Список рецептов из сохранённых фрагментов.
+
+    Фрагмент - карточка рецепта без полей зрителя. Недостающие
+    фрагменты собираются одной выборкой и сохраняются, к каждому
+    добавляются только is_favorited, is_in_shopping_cart и подписка на
+    автора; ?fields= и ?omit= применяются к готовому словарю.
+    """
+
+    def build_fragments(self, recipe_ids):
+        known = known_versions(recipe_ids)
+        recipes = Recipes.objects.with_related().in_bulk(recipe_ids)
+        serializer = self.child.__class__(
+            context=self.context,
+            fields=set(self.child.Meta.fields) - set(VIEWER_FIELDS),
+        )
+        serializer.fields["author"].fields.pop("is_subscribed")
+        fragments = [serializer.to_representation(recipe)
+                     for recipe in recipes.values()]
+        store_fragments(fragments, known)
+        return {fragment["id"]: fragment for fragment in fragments}
+
+    def to_representation(self, data):
+        recipe_ids = [recipe.pk for recipe in data]
+        fragments = get_fragments(recipe_ids)
+        missing = [recipe_id for recipe_id in recipe_ids
+                   if recipe_id not in fragments]
+        if missing:
+            fragments.update(self.build_fragments(missing))
+
+        request = self.context.get("request")
+        membership = get_membership(request)
+        viewer = request.user.pk if request is not None else None
+        names = list(self.child.fields)
+        items = []
+        for recipe_id in recipe_ids:
+            if recipe_id not in fragments:
+                continue
+            item = dict(fragments[recipe_id])
+            item["is_favorited"] = recipe_id in membership.favorites
+            item["is_in_shopping_cart"] = recipe_id in membership.cart
+            author = item.get("author")
+            if author:
+                item["author"] = dict(author, is_subscribed=(
+                    author["id"] != viewer
+                    and author["id"] in membership.subscriptions
+                ))
+            items.append({name: item[name] for name in names})
+        return items
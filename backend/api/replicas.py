@@ -0,0 +1,137 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+
+PRIMARY = "default"
+STICKY_COOKIE = "use_primary"
+STICKY_KEY = "use-primary:{}"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_state = ContextVar("replica_state", default=None)
+
+
+def replicas():
+    return getattr(settings, "REPLICA_DATABASES", ())
+
+
+def sticky_seconds():
+    return getattr(settings, "REPLICA_STICKY_SECONDS", 10)
+
+
+def get_cache():
+    return caches[getattr(settings, "REPLICA_STICKY_CACHE_ALIAS", "default")]
+
+
+def client_key(request):
+    """Клиент с токеном узнаётся по хэшу заголовка Authorization."""
+    authorization = request.META.get("HTTP_AUTHORIZATION")
+    if not authorization:
+        return None
+    return STICKY_KEY.format(
+        hashlib.sha256(authorization.encode()).hexdigest())
+
+
+class ReplicaState:
+    """База запроса: реплика выбирается один раз, чтобы все чтения
+    запроса видели одно и то же состояние данных."""
+
+    __slots__ = ("primary", "replica", "wrote")
+
+    def __init__(self, primary, replica=PRIMARY):
+        self.primary = primary
+        self.replica = replica
+        self.wrote = False
+
+
+def reads_from_replica():
+    state = _state.get()
+    return state is not None and not state.primary and bool(replicas())
+
+
+@contextmanager
+def use_primary():
+    """Читать из основной базы внутри блока."""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    previous, state.primary = state.primary, True
+    try:
+        yield
+    finally:
+        # После записи внутри блока запрос остаётся на основной базе.
+        state.primary = previous or state.wrote
+
+
+class ReplicaRouter:
+    """Чтение безопасных запросов - с реплик, запись - в основную базу.
+
+    Вне HTTP-запросов (команды, фоновые задачи) и после первой записи
+    в запросе всё идёт в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.primary:
+            return PRIMARY
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.primary = True
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaMiddleware:
+    """Выбор базы для запроса с учётом недавних записей клиента.
+
+    Изменяющие запросы целиком работают с основной базой. После записи
+    клиент читает из основной базы ещё REPLICA_STICKY_SECONDS секунд:
+    браузер - по cookie, клиент с токеном - по ключу в кэше, так что
+    только что созданный рецепт не пропадёт из-за отставания реплики.
+    """
+
+    def __init__(self, get_response):
+        if not replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def is_sticky(self, request):
+        if STICKY_COOKIE in request.COOKIES:
+            return True
+        key = client_key(request)
+        return key is not None and get_cache().get(key) is not None
+
+    def __call__(self, request):
+        primary = (request.method not in SAFE_METHODS
+                   or self.is_sticky(request))
+        state = ReplicaState(
+            primary=primary,
+            replica=PRIMARY if primary else random.choice(replicas()),
+        )
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            seconds = sticky_seconds()
+            response.set_cookie(STICKY_COOKIE, "1", max_age=seconds,
+                                httponly=True, samesite="Lax")
+            key = client_key(request)
+            if key is not None:
+                get_cache().set(key, True, seconds)
+        return response
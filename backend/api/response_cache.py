@@ -0,0 +1,141 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.response import Response
+from rest_framework.status import HTTP_200_OK, HTTP_304_NOT_MODIFIED
+
+from api.renderers import FastJSONRenderer
+
+RESPONSE_KEY = "response:{}"
+TAG_KEY = "tag-version:{}"
+
+
+def get_cache():
+    return caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")]
+
+
+def tag_versions(tags, create=False):
+    """Текущие версии тегов; при create недостающие заводятся."""
+    cache = get_cache()
+    keys = {TAG_KEY.format(tag): tag for tag in tags}
+    versions = cache.get_many(keys)
+    if create:
+        for key in keys.keys() - versions.keys():
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def set_versions(tags):
+    get_cache().set_many(
+        {TAG_KEY.format(tag): uuid.uuid4().hex for tag in tags}, None
+    )
+
+
+def invalidate(*tags):
+    """Сбросить все ответы, помеченные любым из тегов.
+
+    Версии меняются сразу и ещё раз после фиксации транзакции: ответ,
+    собранный другим процессом по данным до фиксации, не останется
+    актуальным.
+    """
+    set_versions(tags)
+    transaction.on_commit(lambda: set_versions(tags))
+
+
+def response_key(request):
+    """Ключ по адресу и нормализованной строке запроса.
+
+    Схема и хост входят в ключ: в ответах абсолютные ссылки next и
+    previous.
+    """
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    )
+    source = json.dumps([request.build_absolute_uri(request.path), params],
+                        ensure_ascii=False)
+    return RESPONSE_KEY.format(hashlib.md5(source.encode()).hexdigest())
+
+
+def recipe_tags(data):
+    """Теги ответа с рецептами: рецепты, их авторы и теги."""
+    items = data.get("results", data) if isinstance(data, dict) else data
+    if isinstance(items, dict):
+        items = [items]
+    tags = set()
+    for item in items:
+        tags.add(f"recipe:{item['id']}")
+        if item.get("author"):
+            tags.add(f"author:{item['author']['id']}")
+        tags.update(f"tag:{tag['id']}" for tag in item.get("tags", ()))
+    return tags
+
+
+class AnonymousCacheMixin:
+    """Кэш ответов list/retrieve для анонимных пользователей.
+
+    Ответ хранится вместе с версиями своих тегов и считается устаревшим,
+    как только версия любого тега сменилась. Клиенту отдаётся ETag,
+    повторный запрос с If-None-Match получает 304.
+
+    Версии тегов, известных до запроса к базе (get_request_tags),
+    читаются до него: если изменение зафиксируется, пока ответ
+    собирается, ответ сохранится со старыми версиями и сразу устареет.
+    """
+    cache_tags = ()
+
+    def get_request_tags(self, **kwargs):
+        return set(self.cache_tags)
+
+    def get_cache_tags(self, data):
+        return set(self.cache_tags)
+
+    def cached(self, request, handler, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = response_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            if tag_versions(entry["versions"]) != entry["versions"]:
+                entry = None
+        if entry is None:
+            known = tag_versions(self.get_request_tags(**kwargs),
+                                 create=True)
+            response = handler(request, *args, **kwargs)
+            if response.status_code != HTTP_200_OK:
+                return response
+            content = FastJSONRenderer().render(response.data)
+            data = json.loads(content)
+            versions = tag_versions(self.get_cache_tags(data) - known.keys(),
+                                    create=True)
+            entry = {
+                "data": data,
+                "etag": quote_etag(hashlib.md5(content).hexdigest()),
+                "versions": {**versions, **known},
+            }
+            cache.set(key, entry,
+                      getattr(settings, "RESPONSE_CACHE_TIMEOUT", 300))
+
+        if entry["etag"] in parse_etags(
+            request.META.get("HTTP_IF_NONE_MATCH", "")
+        ):
+            response = Response(status=HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(entry["data"])
+        response["ETag"] = entry["etag"]
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(request, super().retrieve, *args, **kwargs)
@@ -1,18 +1,27 @@
 from django.contrib.auth import get_user_model
 from django.db import transaction
-from django.db.models import F
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import SerializerMethodField
 from rest_framework.serializers import ModelSerializer
+
+from api.feed import fan_out
+from api.images import (RecipeImageField, schedule_cleanup,
+                        schedule_variants)
+from api.membership import get_membership
+from api.recipe_fragments import RecipeFragmentListSerializer
+from api.similar_recipes import schedule_neighbours
+from api.sparse_fields import SparseFieldsMixin
+from api.subscriptions import get_recipes_limit, recipe_previews
 from recipes.models import CountIngredient, Ingredients, Recipes, Tags
+from recipes.shopping_lists import recipe_ingredients_changed
 from users.models import Subscribers
 
 User = get_user_model()
 
 
-class UserSerializer(ModelSerializer):
+class UserSerializer(SparseFieldsMixin, ModelSerializer):
     """Работа с пользователями."""
 
     is_subscribed = SerializerMethodField()
@@ -31,12 +40,13 @@ class UserSerializer(ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """Проверка подписки пользователей."""
-        user = self.context.get("request").user
+        request = self.context.get("request")
+        user = request.user
 
         if user.is_anonymous or (user == obj):
             return False
 
-        return user.subscriptions.filter(author=obj).exists()
+        return obj.id in get_membership(request).subscriptions
 
 
 class RecipeInfoSerializer(ModelSerializer):
@@ -44,7 +54,7 @@ class RecipeInfoSerializer(ModelSerializer):
 
     class Meta:
         model = Recipes
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_variants", "cooking_time")
         read_only_fields = ("__all__",)
 
 
@@ -85,26 +95,28 @@ class SubscribeSerializer(UserSerializer):
 
     def get_recipes_count(self, obj):
         """Количество рецептов каждого автора."""
-        return obj.recipes.count()
+        return obj.recipes_count
 
     def get_recipes(self, obj):
-        params = self.context.get("request").query_params
-        limit = params.get("recipes_limit")
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
-
-        serializer = RecipeInfoSerializer(recipes, many=True)
+        """Последние рецепты автора, для страницы - из recipe_previews."""
+        previews = self.context.get("recipe_previews")
+        if previews is None:
+            previews = recipe_previews(
+                [obj.id], get_recipes_limit(self.context.get("request"))
+            )
+        serializer = RecipeInfoSerializer(previews.get(obj.id, []),
+                                          many=True)
         return serializer.data
 
     def get_is_subscribed(self, obj):
         """Проверка подписки пользователей."""
-        user = self.context.get("request").user
+        request = self.context.get("request")
+        user = request.user
 
         if user.is_anonymous or (user == obj):
             return False
 
-        return user.subscriptions.filter(author=obj).exists()
+        return obj.id in get_membership(request).subscriptions
 
 
 class IngredientSerializer(ModelSerializer):
@@ -123,7 +135,7 @@ class TagSerializer(ModelSerializer):
         fields = "__all__"
 
 
-class RecipeReadSerializer(ModelSerializer):
+class RecipeReadSerializer(SparseFieldsMixin, ModelSerializer):
     """Вывод рецептов."""
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
@@ -141,9 +153,10 @@ class RecipeReadSerializer(ModelSerializer):
             "author",
             "is_favorited",
             "is_in_shopping_cart",
-            "image", "text",
+            "image", "image_variants", "text",
             "name", "cooking_time"
         )
+        list_serializer_class = RecipeFragmentListSerializer
 
     def get_image(self, recipe):
         if recipe.image:
@@ -152,33 +165,32 @@ class RecipeReadSerializer(ModelSerializer):
 
     def get_ingredients(self, recipe):
         """Получить все ингредиенты для данного рецецпта."""
-        ingredients = Ingredients.objects.filter(
-            ingredients_in_recipes__recipe=recipe
-        )
-        return ingredients.values(
-            "id",
-            "name",
-            "measurement_unit",
-            amount=F("ingredients_in_recipes__amount")
-        )
+        rows = recipe.ingredients_for_recipe.all()
+        if "ingredients_for_recipe" not in getattr(
+            recipe, "_prefetched_objects_cache", {}
+        ):
+            rows = rows.select_related("ingredient").order_by(
+                "ingredient__name"
+            )
+        return [
+            {
+                "id": row.ingredient.id,
+                "name": row.ingredient.name,
+                "measurement_unit": row.ingredient.measurement_unit,
+                "amount": row.amount,
+            }
+            for row in rows
+        ]
 
     def get_is_favorited(self, recipe):
         """Проверить наличие рецепта в избранном"""
-        user = self.context.get("view").request.user
-
-        if user.is_anonymous:
-            return False
-
-        return user.favorites.filter(recipe=recipe).exists()
+        request = self.context.get("view").request
+        return recipe.id in get_membership(request).favorites
 
     def get_is_in_shopping_cart(self, recipe):
         """проверить наличие рецепта в корзине"""
-        user = self.context.get("view").request.user
-
-        if user.is_anonymous:
-            return False
-
-        return user.cart.filter(recipe=recipe).exists()
+        request = self.context.get("view").request
+        return recipe.id in get_membership(request).cart
 
 
 class RecipeShortSerializer(ModelSerializer):
@@ -186,7 +198,7 @@ class RecipeShortSerializer(ModelSerializer):
 
     class Meta:
         model = Recipes
-        fields = ("id", "image", "name", "cooking_time")
+        fields = ("id", "image", "image_variants", "name", "cooking_time")
 
 
 class RecipeCreateSerializer(RecipeReadSerializer):
@@ -197,7 +209,7 @@ class RecipeCreateSerializer(RecipeReadSerializer):
     # )
     tags = TagSerializer(many=True, read_only=True)
     ingredients = SerializerMethodField()
-    image = Base64ImageField()
+    image = RecipeImageField()
     author = UserSerializer(read_only=True)
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
@@ -210,22 +222,10 @@ class RecipeCreateSerializer(RecipeReadSerializer):
             "author",
             "is_favorited",
             "is_in_shopping_cart",
-            "image", "text",
+            "image", "image_variants", "text",
             "name", "cooking_time"
         )
 
-    def get_ingredients(self, recipe):
-        """Получить все ингредиенты для данного рецецпта."""
-        ingredients = Ingredients.objects.filter(
-            ingredients_in_recipes__recipe=recipe
-        )
-        return ingredients.values(
-            "id",
-            "name",
-            "measurement_unit",
-            amount=F("ingredients_in_recipes__amount")
-        )
-
     def validate_tags(self, tags):
         if len(tags) == 0:
             raise ValidationError(
@@ -278,28 +278,35 @@ class RecipeCreateSerializer(RecipeReadSerializer):
         return data
 
     def validate_ingredients(self, ingredients):
+        """Проверить ингредиенты одним запросом.
+
+        Возвращает словарь {ингредиент: количество}.
+        """
         if len(ingredients) == 0:
             raise ValidationError(
                 detail="Дожен быть хотя бы один ингредиент!"
             )
-        id_ingredients_list = [item["id"] for item in ingredients]
-        if len(set(id_ingredients_list)) != len(id_ingredients_list):
+        try:
+            amounts = {int(item["id"]): int(item["amount"])
+                       for item in ingredients}
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(
+                detail="Неверный формат ингредиентов!"
+            )
+        if len(amounts) != len(ingredients):
             raise ValidationError(
                 detail="Ингредиенты не должны повторяться!"
             )
-        for item in ingredients:
-            if int(item["amount"]) <= 0:
-                raise ValidationError(
-                    detail="Должен быть хотя бы 1 ингредиент!"
-                )
+        if any(amount <= 0 for amount in amounts.values()):
+            raise ValidationError(
+                detail="Должен быть хотя бы 1 ингредиент!"
+            )
 
-        for ingredient in ingredients:
-            try:
-                Ingredients.objects.get(id=ingredient['id'])
-            except Ingredients.DoesNotExist:
-                raise ValidationError(detail="Ингредиентов нет ")
+        found = Ingredients.objects.in_bulk(amounts)
+        if len(found) != len(amounts):
+            raise ValidationError(detail="Ингредиентов нет ")
 
-        return ingredients
+        return {found[pk]: amount for pk, amount in amounts.items()}
 
     @transaction.atomic
     def create(self, validated_data):
@@ -311,37 +318,64 @@ class RecipeCreateSerializer(RecipeReadSerializer):
             **validated_data
         )
         recipe.tags.set(tags)
-        recipe.tags.set(tags)
-        recipe.tags.set(tags)
 
         CountIngredient.objects.bulk_create(
             [CountIngredient(
-                ingredient=Ingredients.objects.get(id=ingredient['id']),
+                ingredient=ingredient,
                 recipe=recipe,
-                amount=ingredient['amount']
-            ) for ingredient in ingredients]
+                amount=amount
+            ) for ingredient, amount in ingredients.items()]
         )
+        fan_out(recipe)
+        schedule_variants(recipe)
+        schedule_neighbours(recipe)
 
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        """Изменить только отличающиеся строки ингредиентов рецепта."""
+        amounts = {ingredient.id: amount
+                   for ingredient, amount in ingredients.items()}
+        current = {row.ingredient_id: row
+                   for row in CountIngredient.objects.filter(recipe=recipe)}
+
+        # Приращения для списков покупок тех, у кого рецепт в корзине
+        deltas = {pk: (-row.amount, -1) for pk, row in current.items()}
+        for pk, amount in amounts.items():
+            previous, recipes = deltas.get(pk, (0, 0))
+            deltas[pk] = (previous + amount, recipes + 1)
+        removed = current.keys() - amounts.keys()
+        if removed:
+            CountIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for pk, row in current.items():
+            if pk in amounts and row.amount != amounts[pk]:
+                row.amount = amounts[pk]
+                changed.append(row)
+        CountIngredient.objects.bulk_update(changed, ["amount"])
+        CountIngredient.objects.bulk_create(
+            [CountIngredient(
+                ingredient=ingredient,
+                recipe=recipe,
+                amount=amount
+            ) for ingredient, amount in ingredients.items()
+                if ingredient.id not in current]
+        )
+        recipe_ingredients_changed(recipe, deltas)
+
     @transaction.atomic
     def update(self, instance, validated_data):
         """Обновление рецепта."""
         tags = validated_data.pop("tags")
         ingredients = validated_data.pop("ingredients")
-        instance = super().update(instance, validated_data)
-        for key, value in validated_data.items():
-            if hasattr(instance, key):
-                setattr(instance, key, value)
-        instance.tags.clear()
         instance.tags.set(tags)
-        CountIngredient.objects.filter(recipe=instance).delete()
-        CountIngredient.objects.bulk_create(
-            [CountIngredient(
-                ingredient=Ingredients.objects.get(id=ingredient['id']),
-                recipe=instance,
-                amount=ingredient['amount']
-            ) for ingredient in ingredients]
-        )
-        instance.save()
+        self.update_ingredients(instance, ingredients)
+        if "image" in validated_data:
+            schedule_cleanup(instance.image.name)
+            instance.image_variants = {}
+            schedule_variants(instance)
+        instance = super().update(instance, validated_data)
+        schedule_neighbours(instance)
         return instance
@@ -0,0 +1,139 @@
+import csv
+import hashlib
+import io
+import json
+import uuid
+
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
+
+from api.membership import get_cache, get_membership
+from recipes.models import ShoppingLists
+
+RECIPES_VERSION_KEY = "recipes:version"
+CHUNK_SIZE = 500
+
+CONTENT_TYPES = {
+    "txt": "text/plain; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+    "json": "application/json; charset=utf-8",
+}
+CACHED_FORMATS = ("txt", "csv")
+
+
+def get_recipes_version():
+    """Версия состава рецептов; меняется при любой их правке."""
+    cache = get_cache()
+    version = cache.get(RECIPES_VERSION_KEY)
+    if version is None:
+        cache.add(RECIPES_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(RECIPES_VERSION_KEY)
+    return version
+
+
+def bump_recipes_version():
+    get_cache().set(RECIPES_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def shopping_cart_etag(request, file_format):
+    """ETag по содержимому корзины, вычисляемый без запросов к базе."""
+    cart = get_membership(request).cart
+    source = "{}:{}:{}:{}".format(
+        request.user.pk,
+        file_format,
+        get_recipes_version(),
+        ",".join(map(str, sorted(cart))),
+    )
+    return quote_etag(hashlib.md5(source.encode()).hexdigest())
+
+
+def shopping_list(user):
+    """Список покупок пользователя по алфавиту, серверным курсором.
+
+    Суммы хранятся в ShoppingLists и меняются вместе с корзиной, так что
+    выгрузка читает только строки пользователя.
+    """
+    return ShoppingLists.objects.filter(
+        user=user
+    ).values(
+        "ingredient_id",
+        "ingredient__name",
+        "ingredient__measurement_unit"
+    ).annotate(
+        sum=F("amount")
+    ).order_by(
+        "ingredient__name",
+        "ingredient__measurement_unit"
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def stream_txt(ingredients):
+    yield "Список покупок \n"
+    for i, ingredient in enumerate(ingredients):
+        yield "".join([f"Ингредиент №{i+1}: ",
+                       f"{ingredient['ingredient__name']}  ",
+                       f"{ingredient['sum']}",
+                       f"{ingredient['ingredient__measurement_unit']}.\n"
+                       ])
+
+
+def stream_csv(ingredients):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(("name", "amount", "measurement_unit"))
+    for ingredient in ingredients:
+        writer.writerow((
+            ingredient["ingredient__name"],
+            ingredient["sum"],
+            ingredient["ingredient__measurement_unit"],
+        ))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_json(ingredients):
+    separator = "["
+    for ingredient in ingredients:
+        yield separator + json.dumps(
+            {
+                "name": ingredient["ingredient__name"],
+                "amount": ingredient["sum"],
+                "measurement_unit": ingredient["ingredient__measurement_unit"],
+            },
+            ensure_ascii=False,
+        )
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+STREAMS = {
+    "txt": stream_txt,
+    "csv": stream_csv,
+    "json": stream_json,
+}
+
+
+def shopping_cart_response(request, file_format):
+    """Потоковая выгрузка списка покупок в заданном формате."""
+    etag = None
+    if file_format in CACHED_FORMATS:
+        etag = shopping_cart_etag(request, file_format)
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = HttpResponse(status=304)
+            response["ETag"] = etag
+            return response
+
+    response = StreamingHttpResponse(
+        STREAMS[file_format](shopping_list(request.user)),
+        content_type=CONTENT_TYPES[file_format],
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="shopping.{file_format}"'
+    )
+    if etag:
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,124 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import forget_token, forget_user_tokens
+from api.images import schedule_cleanup
+from api.ingredient_index import bump_index_version
+from api.ingredient_recipes import recipe_changed
+from api.membership import forget_membership
+from api.response_cache import invalidate
+from api.shopping_cart import bump_recipes_version
+from recipes.models import (Carts, CountIngredient, Favourites, Ingredients,
+                            Recipes, Tags)
+from users.models import Subscribers
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Recipes)
+@receiver(post_delete, sender=Recipes)
+@receiver(post_save, sender=CountIngredient)
+@receiver(post_delete, sender=CountIngredient)
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Ingredients)
+def recipes_changed(sender, **kwargs):
+    """Состав рецептов изменился: выгрузки корзины устарели."""
+    bump_recipes_version()
+
+
+@receiver(post_save, sender=Recipes)
+@receiver(post_delete, sender=Recipes)
+def recipe_ingredients_index_changed(sender, instance, **kwargs):
+    """Ингредиенты рецепта перечитываются в индексе по ингредиентам."""
+    recipe_changed(instance.pk)
+
+
+@receiver(post_save, sender=CountIngredient)
+@receiver(post_delete, sender=CountIngredient)
+def recipe_ingredient_index_changed(sender, instance, **kwargs):
+    recipe_changed(instance.recipe_id)
+
+
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Ingredients)
+def ingredients_changed(sender, **kwargs):
+    """Справочник ингредиентов изменился: индекс нужно перестроить."""
+    bump_index_version()
+
+
+@receiver(post_save, sender=Recipes)
+@receiver(post_delete, sender=Recipes)
+def recipe_responses_changed(sender, instance, **kwargs):
+    invalidate("recipes", f"recipe:{instance.pk}")
+
+
+@receiver(post_save, sender=CountIngredient)
+@receiver(post_delete, sender=CountIngredient)
+def recipe_ingredient_responses_changed(sender, instance, **kwargs):
+    invalidate(f"recipe:{instance.recipe_id}")
+
+
+@receiver(m2m_changed, sender=Recipes.tags.through)
+def recipe_tags_responses_changed(sender, instance, action, reverse,
+                                  **kwargs):
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        invalidate("recipes", f"tag:{instance.pk}")
+    else:
+        invalidate("recipes", f"recipe:{instance.pk}")
+
+
+@receiver(post_save, sender=Tags)
+@receiver(post_delete, sender=Tags)
+def tag_responses_changed(sender, instance, **kwargs):
+    invalidate("tags", f"tag:{instance.pk}")
+
+
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Ingredients)
+def ingredient_responses_changed(sender, **kwargs):
+    invalidate("ingredients")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def author_responses_changed(sender, instance, **kwargs):
+    if kwargs.get("update_fields") == frozenset({"last_login"}):
+        return
+    invalidate(f"author:{instance.pk}")
+
+
+@receiver(post_save, sender=User)
+def user_tokens_changed(sender, instance, **kwargs):
+    """Пароль, активность или данные пользователя изменились:
+    кэшированный вместе с токеном пользователь устарел."""
+    if kwargs.get("update_fields") == frozenset({"last_login"}):
+        return
+    forget_user_tokens(instance)
+
+
+@receiver(post_delete, sender=Recipes)
+def recipe_image_deleted(sender, instance, **kwargs):
+    """Копии картинки удалённого рецепта больше не нужны."""
+    schedule_cleanup(instance.image.name)
+
+
+@receiver(post_save, sender=Favourites)
+@receiver(post_delete, sender=Favourites)
+@receiver(post_save, sender=Carts)
+@receiver(post_delete, sender=Carts)
+@receiver(post_save, sender=Subscribers)
+@receiver(post_delete, sender=Subscribers)
+def membership_changed(sender, instance, **kwargs):
+    """Изменения из админки и каскадные удаления (рецепта, автора)
+    сбрасывают кэш избранного, корзины и подписок."""
+    forget_membership(instance.user_id)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Выход через djoser и удаление токена или пользователя."""
+    forget_token(instance.key)
@@ -0,0 +1,258 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from api.ingredient_recipes import get_ingredient_recipes_index
+from recipes.models import CountIngredient, Neighbours, Recipes
+
+TagsThrough = Recipes.tags.through
+
+logger = logging.getLogger(__name__)
+_executor = None
+
+
+def similar_setting(name, default):
+    return getattr(settings, f"SIMILAR_RECIPES_{name}", default)
+
+
+def top_neighbours(recipe_ids, scores, count):
+    """count лучших пар (id, сходство) с ненулевым сходством; при
+    равном сходстве выше рецепт с меньшим id."""
+    if scores.size > count:
+        threshold = np.partition(scores, scores.size - count)[-count]
+        best = np.flatnonzero(scores >= threshold)
+    else:
+        best = np.arange(scores.size)
+    best = best[np.lexsort((recipe_ids[best], -scores[best]))][:count]
+    return [(int(recipe_ids[position]), float(scores[position]))
+            for position in best if scores[position] > 0]
+
+
+def store(neighbours):
+    """Заменить списки соседей рецептов: {id: [(id соседа, сходство)]}."""
+    with transaction.atomic():
+        Neighbours.objects.filter(recipe_id__in=neighbours).delete()
+        Neighbours.objects.bulk_create([
+            Neighbours(recipe_id=recipe_id, neighbour_id=neighbour_id,
+                       score=score)
+            for recipe_id, pairs in neighbours.items()
+            for neighbour_id, score in pairs
+        ])
+
+
+# Число единичных битов в каждом байте
+POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)],
+                    dtype=np.uint8)
+
+
+def pairs_array(rows, recipe_ids):
+    """Пары (позиция рецепта, признак) без повторов, по порядку рецептов."""
+    rows = np.array(rows, dtype=np.int64).reshape(-1, 2)
+    rows[:, 0] = np.searchsorted(recipe_ids, rows[:, 0])
+    return np.unique(rows, axis=0)
+
+
+class InvertedIndex:
+    """Рецепты по признаку: postings[starts[i]:ends[i]] - позиции
+    рецептов с признаком номер i."""
+
+    def __init__(self, pairs):
+        self.features, columns = np.unique(pairs[:, 1], return_inverse=True)
+        order = np.argsort(columns, kind="stable")
+        self.postings = pairs[order, 0]
+        self.starts = np.searchsorted(columns[order],
+                                      np.arange(self.features.size))
+        self.ends = np.append(self.starts[1:], self.postings.size)
+        self.columns = columns
+
+    def co_occurrences(self, pairs, rows):
+        """Пары (позиция из pairs[rows], позиция рецепта с тем же
+        признаком) и число общих признаков у каждой пары."""
+        columns = self.columns[rows]
+        lengths = self.ends[columns] - self.starts[columns]
+        left = np.repeat(pairs[rows, 0], lengths)
+        offsets = np.repeat(self.starts[columns] - np.cumsum(lengths)
+                            + lengths, lengths)
+        right = self.postings[offsets + np.arange(lengths.sum())]
+        return left, right
+
+
+def tag_bits(pairs, size):
+    """Теги рецептов битами: строка - рецепт, бит - тег."""
+    _, columns = np.unique(pairs[:, 1], return_inverse=True)
+    bits = np.zeros((size, columns.max() // 8 + 1 if columns.size else 1),
+                    dtype=np.uint8)
+    np.bitwise_or.at(bits, (pairs[:, 0], columns // 8),
+                     (1 << (columns % 8)).astype(np.uint8))
+    return bits
+
+
+def compute_all(batch_size=256, count=None):
+    """Посчитать соседей всех рецептов пачками по batch_size рецептов.
+
+    Сходство - косинус векторов из ингредиентов и тегов с весом
+    SIMILAR_RECIPES_TAG_WEIGHT. Рецепты без общих ингредиентов не
+    считаются похожими, поэтому кандидаты пачки берутся из обратного
+    индекса по ингредиентам: память зависит от числа пар с общими
+    ингредиентами в пачке, а не от размера каталога. Возвращает число
+    обработанных рецептов.
+    """
+    count = count or similar_setting("COUNT", 10)
+    tag_factor = similar_setting("TAG_WEIGHT", 0.5) ** 2
+    recipe_ids = np.array(
+        sorted(Recipes.objects.values_list("id", flat=True)), dtype=np.int64)
+    size = recipe_ids.size
+    if not size:
+        return 0
+    ingredients = pairs_array(
+        CountIngredient.objects.values_list("recipe_id", "ingredient_id"),
+        recipe_ids)
+    tags = pairs_array(
+        TagsThrough.objects.values_list("recipes_id", "tags_id"), recipe_ids)
+    index = InvertedIndex(ingredients)
+    bits = tag_bits(tags, size)
+    norms = np.sqrt(
+        np.bincount(ingredients[:, 0], minlength=size)
+        + tag_factor * np.bincount(tags[:, 0], minlength=size)
+    ).astype(np.float32)
+    norms[norms == 0] = 1
+    # Пары пачки ищутся по первому столбцу: pairs_array упорядочивает его
+    bounds = np.searchsorted(ingredients[:, 0],
+                             np.arange(0, size + batch_size, batch_size))
+
+    for batch, start in enumerate(range(0, size, batch_size)):
+        left, right = index.co_occurrences(
+            ingredients, np.arange(bounds[batch], bounds[batch + 1]))
+        keys, shared = np.unique(left * size + right, return_counts=True)
+        left, right = np.divmod(keys, size)
+        keep = left != right
+        left, right, shared = left[keep], right[keep], shared[keep]
+        shared_tags = POPCOUNT[bits[left] & bits[right]].sum(axis=1)
+        scores = ((shared + tag_factor * shared_tags).astype(np.float32)
+                  / norms[left] / norms[right])
+        positions = np.arange(start, min(start + batch_size, size))
+        splits = np.searchsorted(left, np.append(positions, size))
+        store({
+            int(recipe_ids[position]): top_neighbours(
+                recipe_ids[right[splits[i]:splits[i + 1]]],
+                scores[splits[i]:splits[i + 1]], count)
+            for i, position in enumerate(positions)
+        })
+    return int(size)
+
+
+def load_tags(tags, recipe_ids):
+    """Дополнить словарь {id рецепта: множество id тегов}."""
+    missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in tags]
+    for recipe_id in missing:
+        tags[recipe_id] = set()
+    for recipe_id, tag_id in TagsThrough.objects.filter(
+        recipes_id__in=missing
+    ).values_list("recipes_id", "tags_id"):
+        tags[recipe_id].add(tag_id)
+
+
+def score_candidates(index, tags, recipe_id, tag_factor):
+    """Сходство рецепта с рецептами, где есть его ингредиенты.
+
+    Считает то же, что compute_all, но только по кандидатам из индекса.
+    """
+    ingredients = index.recipes.get(recipe_id, frozenset())
+    candidates, shared, _ = index.rank(ingredients)
+    keep = candidates != recipe_id
+    candidates, shared = candidates[keep], shared[keep]
+    load_tags(tags, [recipe_id, *candidates.tolist()])
+    own_tags = tags[recipe_id]
+    shared_tags = np.fromiter(
+        (len(own_tags & tags[other]) for other in candidates.tolist()),
+        dtype=np.float32, count=candidates.size)
+    sizes = np.fromiter(
+        (len(index.recipes[other]) + tag_factor * len(tags[other])
+         for other in candidates.tolist()),
+        dtype=np.float32, count=candidates.size)
+    norm = np.sqrt(len(ingredients) + tag_factor * len(own_tags)) or 1
+    scores = ((shared + tag_factor * shared_tags)
+              / norm / np.sqrt(np.maximum(sizes, 1)))
+    return candidates, scores
+
+
+def update_neighbours(recipe_id):
+    """Пересчитать соседей нового или изменённого рецепта.
+
+    Кандидаты берутся из индекса по ингредиентам, так что пересчёт
+    не читает все рецепты. Рецепт вставляется в списки соседей, где он
+    теперь похожее последнего; списки, где его сходство уменьшилось,
+    пересчитываются целиком.
+    """
+    count = similar_setting("COUNT", 10)
+    tag_factor = similar_setting("TAG_WEIGHT", 0.5) ** 2
+    index = get_ingredient_recipes_index()
+    if recipe_id not in index.recipes:
+        # Рецепт уже удалён, его соседи удалены каскадом.
+        return
+    tags = {}
+    candidates, scores = score_candidates(index, tags, recipe_id,
+                                          tag_factor)
+    changed = {recipe_id: top_neighbours(candidates, scores, count)}
+
+    score_of = dict(zip(candidates.tolist(), scores.tolist()))
+    previous = dict(Neighbours.objects.filter(
+        neighbour_id=recipe_id).values_list("recipe_id", "score"))
+    rebuild = {other_id for other_id, score in previous.items()
+               if score_of.get(other_id, 0) < score}
+    for other_id in rebuild:
+        changed[other_id] = top_neighbours(
+            *score_candidates(index, tags, other_id, tag_factor), count)
+
+    lists = defaultdict(list)
+    for other_id, neighbour_id, score in Neighbours.objects.filter(
+        recipe_id__in=score_of.keys() - rebuild
+    ).exclude(neighbour_id=recipe_id).values_list(
+        "recipe_id", "neighbour_id", "score"
+    ):
+        lists[other_id].append((neighbour_id, score))
+    for other_id, score in score_of.items():
+        if other_id in rebuild:
+            continue
+        pairs = lists[other_id]
+        if len(pairs) >= count and score <= min(pair[1] for pair in pairs):
+            continue
+        pairs.append((recipe_id, score))
+        pairs.sort(key=lambda pair: (-pair[1], pair[0]))
+        changed[other_id] = pairs[:count]
+    store(changed)
+
+
+def run_job(recipe_id):
+    try:
+        update_neighbours(recipe_id)
+    except Exception:
+        logger.exception("Не удалось пересчитать соседей рецепта %s",
+                         recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_neighbours(recipe):
+    """Пересчитать соседей в фоне после фиксации транзакции.
+
+    Один поток на процесс: пересчёты процесса не перемешивают записи
+    в таблице соседей.
+    """
+    recipe_id = recipe.pk
+
+    def submit():
+        global _executor
+        if similar_setting("SYNC", False):
+            update_neighbours(recipe_id)
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="similar-recipes")
+        _executor.submit(run_job, recipe_id)
+
+    transaction.on_commit(submit)
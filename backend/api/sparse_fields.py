@@ -0,0 +1,44 @@
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = "fields"
+OMIT_PARAM = "omit"
+
+
+def field_names(request, param):
+    return {name.strip()
+            for value in request.query_params.getlist(param)
+            for name in value.split(",") if name.strip()}
+
+
+def output_fields(request, serializer_class):
+    """Поля ответа по ?fields=a,b и ?omit=c; None - все поля.
+
+    id выводится всегда: по нему помечаются ответы в кэше. Вложенный
+    объект (author, tags, ingredients) выводится или пропускается целиком.
+    """
+    if request is None:
+        return None
+    fields = field_names(request, FIELDS_PARAM)
+    omit = field_names(request, OMIT_PARAM)
+    if not fields and not omit:
+        return None
+    available = set(serializer_class.Meta.fields)
+    unknown = (fields | omit) - available
+    if unknown:
+        names = ", ".join(sorted(unknown))
+        raise ValidationError({FIELDS_PARAM: f"Неизвестные поля: {names}."})
+    return frozenset(((fields or available) - omit) | {"id"})
+
+
+class SparseFieldsMixin:
+    """Сериализатор только с полями из fields.
+
+    Убранные поля, в том числе SerializerMethodField и вложенные
+    сериализаторы, не вычисляются.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in self.fields.keys() - fields:
+                self.fields.pop(name)
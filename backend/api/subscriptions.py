@@ -0,0 +1,64 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Recipes
+
+PREVIEW_FIELDS = ("id", "author_id", "name", "image", "image_variants",
+                  "cooking_time")
+
+
+def max_recipes_limit():
+    return getattr(settings, "SUBSCRIPTIONS_RECIPES_LIMIT", 20)
+
+
+def get_recipes_limit(request):
+    """recipes_limit из запроса, не больше SUBSCRIPTIONS_RECIPES_LIMIT.
+
+    Без параметра отдаётся наибольшее допустимое число рецептов.
+    """
+    value = request.query_params.get("recipes_limit")
+    if value in (None, ""):
+        return max_recipes_limit()
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = -1
+    if limit < 0:
+        raise ValidationError(
+            {"recipes_limit": "Должно быть целым неотрицательным числом."}
+        )
+    return min(limit, max_recipes_limit())
+
+
+def recipe_previews(author_ids, limit):
+    """Последние limit рецептов каждого автора одним запросом:
+    {id автора: [рецепты]}.
+
+    ROW_NUMBER() нумерует рецепты внутри автора, так что база отдаёт
+    не больше limit строк на автора.
+    """
+    previews = defaultdict(list)
+    if not author_ids or limit <= 0:
+        return previews
+    connection = connections[Recipes.objects.db]
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(field) for field in PREVIEW_FIELDS)
+    sql = (
+        f"SELECT {columns} FROM ("
+        f"SELECT {columns}, ROW_NUMBER() OVER ("
+        f"PARTITION BY {quote('author_id')} "
+        f"ORDER BY {quote('date')} DESC, {quote('id')} DESC"
+        f") AS {quote('position')} "
+        f"FROM {quote(Recipes._meta.db_table)} "
+        f"WHERE {quote('author_id')} IN "
+        f"({', '.join(['%s'] * len(author_ids))})"
+        f") AS {quote('ranked')} "
+        f"WHERE {quote('position')} <= %s "
+        f"ORDER BY {quote('author_id')}, {quote('position')}"
+    )
+    for recipe in Recipes.objects.raw(sql, [*author_ids, limit]):
+        previews[recipe.author_id].append(recipe)
+    return previews
@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http.response import HttpResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
 from django.shortcuts import get_object_or_404
 from django_filters import rest_framework as filters
 from djoser.views import UserViewSet as DjoserUserViewSet
@@ -11,54 +12,92 @@ from rest_framework.status import (HTTP_201_CREATED, HTTP_204_NO_CONTENT,
                                    HTTP_400_BAD_REQUEST)
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from api.filters import IngredientsFilter, RecipesFilter
-from api.paginators import LimitPagination
+from api.feed import backfill, forget, pull_popular
+from api.filters import RecipesFilter
+from api.ingredient_index import get_ingredient_index
+from api.ingredient_recipes import get_ingredient_recipes_index
+from api.membership import update_membership, update_membership_many
+from api.paginators import FeedPagination, LimitPagination, PagePagination
 from api.permissions import AuthorOrAdminOrReadOnly
+from api.renderers import CSVRenderer, FastJSONRenderer, PlainTextRenderer
+from api.response_cache import AnonymousCacheMixin, recipe_tags
 from api.serializers import (IngredientSerializer, RecipeCreateSerializer,
                              RecipeReadSerializer, RecipeShortSerializer,
                              SubscribeSerializer, TagSerializer,
                              UserSerializer)
-from recipes.models import (Carts, CountIngredient, Favourites, Ingredients,
-                            Recipes, Tags)
+from api.shopping_cart import shopping_cart_response, shopping_list
+from api.sparse_fields import output_fields
+from api.subscriptions import get_recipes_limit, recipe_previews
+from recipes.counters import (add_links, bulk_counters, change_counters,
+                              remove_links)
+from recipes.shopping_lists import cart_changed
+from recipes.models import (Carts, Favourites, Feeds, Ingredients, Recipes,
+                            Tags)
 from users.models import Subscribers, Users
 
 User = get_user_model()
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(AnonymousCacheMixin, ReadOnlyModelViewSet):
     """Класс для тегов рецептов."""
     queryset = Tags.objects.all()
     serializer_class = TagSerializer
+    cache_tags = ("tags",)
     # permission_classes = (AdminOrReadOnly,)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(AnonymousCacheMixin, ReadOnlyModelViewSet):
     """Класс для ингредиентов рецептов."""
     queryset = Ingredients.objects.all()
     serializer_class = IngredientSerializer
+    cache_tags = ("ingredients",)
     # permission_classes = (AdminOrReadOnly,)
-    filter_backends = (filters.DjangoFilterBackend, )
-    filterset_class = IngredientsFilter
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, self.search)
+
+    def search(self, request):
+        """Поиск по индексу в памяти: сначала по началу имени."""
+        index = get_ingredient_index()
+        return Response(index.search(request.query_params.get("name", "")))
 
 
 class UserViewSet(DjoserUserViewSet):
     """Класс для пользователей."""
     permission_classes = (DjangoModelPermissions,)
     pagination_class = LimitPagination
+    cursor_ordering = "-id"
     queryset = Users.objects.all()
     serializer_class = UserSerializer
 
+    def get_serializer(self, *args, **kwargs):
+        if (self.request.method == "GET"
+                and self.action in ("list", "retrieve", "me")):
+            kwargs.setdefault("fields", output_fields(
+                self.request, self.get_serializer_class()))
+        return super().get_serializer(*args, **kwargs)
+
     @action(detail=False,
             methods=["GET"],
             permission_classes=(IsAuthenticated, ))
     def subscriptions(self, request):
-        """Cписок подписок."""
+        """Cписок подписок.
+
+        Рецепты всех авторов страницы загружаются одним запросом.
+        """
+        fields = output_fields(request, SubscribeSerializer)
         pages = self.paginate_queryset(
             User.objects.filter(subscribers__user=request.user)
         )
+        previews = {}
+        if fields is None or "recipes" in fields:
+            previews = recipe_previews([author.id for author in pages],
+                                       get_recipes_limit(request))
         serializer = SubscribeSerializer(pages,
                                          many=True,
-                                         context={"request": request}
+                                         fields=fields,
+                                         context={"request": request,
+                                                  "recipe_previews": previews}
                                          )
         return self.get_paginated_response(serializer.data)
 
@@ -74,6 +113,8 @@ class UserViewSet(DjoserUserViewSet):
                 user=request.user,
                 author=author
             )
+            update_membership(request, "subscriptions", author.id, True)
+            backfill(request.user, author)
             return Response(serializer.data, status=HTTP_201_CREATED)
         subscription = Subscribers.objects.filter(
             user=request.user,
@@ -83,34 +124,136 @@ class UserViewSet(DjoserUserViewSet):
             return Response({"errors": "No"},
                             status=HTTP_400_BAD_REQUEST)
         subscription[0].delete()
+        update_membership(request, "subscriptions", author.id, False)
+        forget(request.user, author)
         return Response(status=HTTP_204_NO_CONTENT)
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(AnonymousCacheMixin, ModelViewSet):
     queryset = Recipes.objects.all()
     pagination_class = LimitPagination
     permission_classes = (AuthorOrAdminOrReadOnly, )
     filter_backends = (filters.DjangoFilterBackend, )
     filterset_class = RecipesFilter
+    cache_tags = ("recipes", "ingredients")
+    # Списки собираются из фрагментов (api.recipe_fragments): из базы
+    # нужны только id рецептов страницы
+    fragment_actions = ("list", "feed", "by_ingredients", "similar")
+
+    def get_queryset(self):
+        if self.action in self.fragment_actions:
+            return Recipes.objects.only("id", "date")
+        return Recipes.objects.with_related(self.get_output_fields())
+
+    def get_request_tags(self, **kwargs):
+        tags = super().get_request_tags(**kwargs)
+        if "pk" in kwargs:
+            tags.add(f"recipe:{kwargs['pk']}")
+        return tags
+
+    def get_cache_tags(self, data):
+        return super().get_cache_tags(data) | recipe_tags(data)
 
     def get_serializer_class(self):
         if self.action in ["create", "update", "partial_update"]:
             return RecipeCreateSerializer
         return RecipeReadSerializer
 
+    def get_output_fields(self):
+        """Поля рецептов в ответе на GET по ?fields= и ?omit=."""
+        if self.request.method != "GET":
+            return None
+        return output_fields(self.request, RecipeReadSerializer)
+
+    def get_serializer(self, *args, **kwargs):
+        if self.get_serializer_class() is RecipeReadSerializer:
+            kwargs.setdefault("fields", self.get_output_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    @action(detail=False,
+            methods=["GET"],
+            permission_classes=(IsAuthenticated,),
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """Лента рецептов авторов из подписок."""
+        pull_popular(request.user)
+        page = self.paginate_queryset(
+            Feeds.objects.filter(user=request.user)
+        )
+        recipes = self.get_queryset().in_bulk(
+            [item.recipe_id for item in page]
+        )
+        serializer = self.get_serializer(
+            [recipes[item.recipe_id] for item in page
+             if item.recipe_id in recipes],
+            many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["GET"], url_path="by-ingredients",
+            pagination_class=PagePagination)
+    def by_ingredients(self, request):
+        """Что приготовить из ингредиентов ?have=1,5,9.
+
+        Сначала рецепты с большим числом совпавших ингредиентов, затем
+        с меньшим числом недостающих. Ранжированный список - не выборка,
+        поэтому страницы только по номеру, ?cursor= не действует.
+        """
+        try:
+            have = {int(pk)
+                    for value in request.query_params.getlist("have")
+                    for pk in value.split(",") if pk.strip()}
+        except ValueError:
+            return Response({"errors": "Неверный список ингредиентов!"},
+                            status=HTTP_400_BAD_REQUEST)
+        if not have:
+            return Response({"errors": "Не указаны ингредиенты!"},
+                            status=HTTP_400_BAD_REQUEST)
+        recipe_ids, matched, missing = (
+            get_ingredient_recipes_index().rank(have)
+        )
+        page = self.paginate_queryset(list(zip(
+            recipe_ids.tolist(), matched.tolist(), missing.tolist()
+        )))
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        page = [row for row in page if row[0] in recipes]
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _, _ in page],
+            many=True
+        )
+        data = serializer.data
+        for item, (_, matched_count, missing_count) in zip(data, page):
+            item["matched_count"] = matched_count
+            item["missing_count"] = missing_count
+        return self.get_paginated_response(data)
+
+    @action(detail=True, methods=["GET"])
+    def similar(self, request, pk):
+        """Похожие рецепты, посчитанные заранее (api.similar_recipes)."""
+        recipe = self.get_object()
+        recipes = self.get_queryset().filter(
+            neighbour_of__recipe=recipe
+        ).order_by("-neighbour_of__score", "id")
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
     @action(detail=True, methods=["DELETE", "POST"])
     def shopping_cart(self, request, pk):
-        queryset = Carts.objects.filter(user=request.user, recipe__id=pk)
-
         if request.method == "POST":
             recipe = Recipes.objects.filter(pk=pk)
             if not recipe:
                 return Response({"errors": "No"},
                                 status=HTTP_400_BAD_REQUEST)
-            if queryset.exists():
+            try:
+                with transaction.atomic():
+                    Carts.objects.create(user=request.user,
+                                         recipe=recipe[0])
+            except IntegrityError:
                 return Response({"errors": "Рецепт уже добавлен!"},
                                 status=HTTP_400_BAD_REQUEST)
-            Carts.objects.create(user=request.user, recipe=recipe[0])
+            update_membership(request, "cart", recipe[0].id, True)
             serializer = RecipeShortSerializer(recipe[0])
             return Response(serializer.data, status=HTTP_201_CREATED)
 
@@ -124,21 +267,24 @@ class RecipeViewSet(ModelViewSet):
                 return Response({"errors": "No"},
                                 status=HTTP_400_BAD_REQUEST)
             in_cart[0].delete()
+            update_membership(request, "cart", recipe.id, False)
             return Response(status=HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=["DELETE", "POST"])
     def favorite(self, request, pk):
-        queryset = Favourites.objects.filter(user=request.user, recipe__id=pk)
-
         if request.method == "POST":
             recipe = Recipes.objects.filter(pk=pk)
             if not recipe:
                 return Response({"errors": "No"},
                                 status=HTTP_400_BAD_REQUEST)
-            if queryset.exists():
+            try:
+                with transaction.atomic():
+                    Favourites.objects.create(user=request.user,
+                                              recipe=recipe[0])
+            except IntegrityError:
                 return Response({"errors": "Рецепт уже добавлен!"},
                                 status=HTTP_400_BAD_REQUEST)
-            Favourites.objects.create(user=request.user, recipe=recipe[0])
+            update_membership(request, "favorites", recipe[0].id, True)
             serializer = RecipeShortSerializer(recipe[0])
             return Response(serializer.data, status=HTTP_201_CREATED)
 
@@ -152,29 +298,94 @@ class RecipeViewSet(ModelViewSet):
                 return Response({"errors": "No"},
                                 status=HTTP_400_BAD_REQUEST)
             in_favorites[0].delete()
+            update_membership(request, "favorites", recipe.id, False)
             return Response(status=HTTP_204_NO_CONTENT)
 
+    def bulk_change(self, request, model, field, counter):
+        """Добавить (POST) или убрать (DELETE) несколько рецептов разом.
+
+        Тело запроса: {"recipes": [1, 2, 3]}. Рецепты проверяются одним
+        запросом, изменения вносятся одной вставкой или одним удалением
+        (recipes.counters.add_links, remove_links), в ответе - итог по
+        каждому id.
+        """
+        limit = getattr(settings, "BULK_RECIPES_LIMIT", 100)
+        ids = (request.data.get("recipes")
+               if isinstance(request.data, dict) else None)
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in ids))
+        except (TypeError, ValueError):
+            ids = None
+        if not ids or len(ids) > limit:
+            return Response(
+                {"errors": f"Нужен список id рецептов, не больше {limit}!"},
+                status=HTTP_400_BAD_REQUEST)
+
+        present = dict(Recipes.objects.filter(id__in=ids).annotate(
+            present=Exists(model.objects.filter(user=request.user,
+                                                recipe=OuterRef("pk")))
+        ).values_list("id", "present"))
+        adding = request.method == "POST"
+        sign = 1 if adding else -1
+        # Проверка выше могла устареть из-за параллельного запроса:
+        # счётчики и списки покупок меняются только по строкам, которые
+        # действительно вставлены или удалены здесь.
+        with transaction.atomic(), bulk_counters():
+            changed = (add_links if adding else remove_links)(
+                model, request.user.pk,
+                [pk for pk, here in present.items() if here != adding],
+            )
+            change_counters(Recipes, changed, counter, sign)
+            if model is Carts:
+                cart_changed(request.user.pk, changed, sign)
+        update_membership_many(request, field, changed, adding)
+
+        done, skipped = ("added", "exists") if adding else ("removed",
+                                                            "absent")
+        changed = set(changed)
+        return Response({"results": [
+            {"id": pk,
+             "status": ("not_found" if pk not in present
+                        else done if pk in changed else skipped)}
+            for pk in ids
+        ]})
+
+    @action(detail=False,
+            methods=["POST", "DELETE"],
+            url_path="shopping_cart/bulk",
+            permission_classes=(IsAuthenticated,))
+    def shopping_cart_bulk(self, request):
+        """Корзина для нескольких рецептов."""
+        return self.bulk_change(request, Carts, "cart", "carts_count")
+
+    @action(detail=False,
+            methods=["POST", "DELETE"],
+            url_path="favorite/bulk",
+            permission_classes=(IsAuthenticated,))
+    def favorite_bulk(self, request):
+        """Избранное для нескольких рецептов."""
+        return self.bulk_change(request, Favourites, "favorites",
+                                "favorites_count")
+
     @action(detail=False,
             methods=["GET"],
             permission_classes=(IsAuthenticated,))
+    def shopping_list(self, request):
+        """Суммы ингредиентов рецептов из корзины."""
+        return Response([
+            {"id": row["ingredient_id"],
+             "name": row["ingredient__name"],
+             "measurement_unit": row["ingredient__measurement_unit"],
+             "amount": row["sum"]}
+            for row in shopping_list(request.user)
+        ])
+
+    @action(detail=False,
+            methods=["GET"],
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(PlainTextRenderer, CSVRenderer,
+                              FastJSONRenderer))
     def download_shopping_cart(self, request):
-        ingredients = CountIngredient.objects.filter(
-            recipe__cart__user=request.user
-        ).values(
-            "ingredient__name",
-            "ingredient__measurement_unit"
-        ).annotate(
-            sum=Sum("amount")
-        )
-        shopping_list = ["Список покупок \n"]
-        for i, ingredient in enumerate(ingredients):
-            line = "".join([f"Ингредиент №{i+1}: ",
-                            f"{ingredient['ingredient__name']}  ",
-                            f"{ingredient['sum']}",
-                            f"{ingredient['ingredient__measurement_unit']}.\n"
-                            ])
-            shopping_list.append(line)
-        response = HttpResponse(
-            shopping_list, content_type="text.txt; charset=utf-8")
-        response["Content-Disposition"] = "attachment; filename='shopping.txt'"
-        return response
+        """Список покупок: ?format=txt|csv|json."""
+        return shopping_cart_response(request,
+                                      request.accepted_renderer.format)
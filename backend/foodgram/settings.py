@@ -28,6 +28,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.profiling.RequestProfilingMiddleware",
+    "api.replicas.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -69,6 +71,117 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения (api.replicas): DB_REPLICA_HOSTS через запятую.
+# После записи клиент ещё REPLICA_STICKY_SECONDS секунд читает
+# из основной базы, пока реплики догоняют её.
+REPLICA_DATABASES = []
+for number, host in enumerate(
+    filter(None, os.getenv("DB_REPLICA_HOSTS", "").split(",")), start=1
+):
+    alias = f"replica{number}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    REPLICA_DATABASES.append(alias)
+REPLICA_STICKY_SECONDS = 10
+REPLICA_STICKY_CACHE_ALIAS = "default"
+DATABASE_ROUTERS = ["api.replicas.ReplicaRouter"]
+
+# Версии кэшей, журнал изменений рецептов (api.ingredient_recipes),
+# версия индекса ингредиентов и отзыв токенов должны быть видны всем
+# процессам и командам manage.py: в рабочем окружении нужен общий кэш,
+# например CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache
+# и CACHE_LOCATION=memcached:11211 (infra). LocMemCache годится только для
+# разработки в одном процессе; без DEBUG на него указывает проверка api.W001.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "foodgram"),
+    }
+}
+# По умолчанию LocMemCache хранит 300 записей: карточки рецептов,
+# версии тегов и ответы вытесняли бы друг друга.
+if CACHES["default"]["BACKEND"].endswith("LocMemCache"):
+    CACHES["default"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", 10000)),
+    }
+
+# Кэш избранного, корзины и подписок пользователя (api.membership)
+MEMBERSHIP_CACHE_ALIAS = "default"
+MEMBERSHIP_CACHE_TIMEOUT = 300
+
+# Кэш ответов для анонимных пользователей (api.response_cache)
+RESPONSE_CACHE_ALIAS = "default"
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Карточки рецептов без полей зрителя (api.recipe_fragments); устаревают
+# по тем же тегам, что и ответы. С LocMemCache сброс версий виден только
+# своему процессу (см. CACHES): срок ограничивает, сколько другие
+# процессы отдают устаревшую карточку.
+RECIPE_FRAGMENT_CACHE_ALIAS = "default"
+RECIPE_FRAGMENT_TIMEOUT = 60 * 60
+
+# Лента подписок: авторам с большим числом подписчиков рецепты
+# не раскладываются по лентам при публикации, а забираются при чтении
+FEED_FANOUT_LIMIT = 1000
+FEED_BACKFILL_SIZE = 20
+
+# Наибольшее число рецептов в одном запросе .../favorite/bulk/ и
+# .../shopping_cart/bulk/
+BULK_RECIPES_LIMIT = 100
+
+# Наибольший recipes_limit в списке подписок (api.subscriptions)
+SUBSCRIPTIONS_RECIPES_LIMIT = 20
+
+# Картинки рецептов (api.images): ограничения загрузки и копии,
+# которые строятся в фоне после сохранения рецепта
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+RECIPE_IMAGE_VARIANTS = {
+    "thumbnail": 160,
+    "card": 480,
+    "full": 1200,
+}
+RECIPE_IMAGE_WORKERS = 2
+
+# Похожие рецепты (api.similar_recipes): сколько соседей хранить и вес
+# тегов относительно ингредиентов в векторе рецепта
+SIMILAR_RECIPES_COUNT = 10
+SIMILAR_RECIPES_TAG_WEIGHT = 0.5
+
+# Профилирование запросов (api.profiling): число и время SQL-запросов,
+# повторы запросов, время сериализации и рендеринга в заголовке
+# Server-Timing и в логе api.profiling
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "False") in (
+    "True", "true", "1"
+)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "api.profiling": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
+# Кэш токенов (api.authentication): в процессе на LOCAL_TIMEOUT секунд и
+# в кэше Django на CACHE_TIMEOUT секунд. Отзыв удаляет запись из кэша Django
+# сразу, поэтому при общем кэше (см. CACHES) отозванный токен работает
+# в других процессах не дольше LOCAL_TIMEOUT; с LocMemCache - до
+# CACHE_TIMEOUT. Это касается только чтения: изменяющие запросы проверяют
+# токен по базе.
+AUTH_TOKEN_CACHE_ALIAS = "default"
+AUTH_TOKEN_CACHE_TIMEOUT = 300
+AUTH_TOKEN_LOCAL_TIMEOUT = 30
+AUTH_TOKEN_LOCAL_SIZE = 1024
+
 AUTH_USER_MODEL = "users.Users"
 
 
@@ -132,11 +245,21 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
+    # orjson, если установлен, иначе стандартный json
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "api.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
 
@@ -0,0 +1,24 @@
+import os
+import tempfile
+
+from foodgram.settings import *  # noqa: F401,F403
+from foodgram.settings import DATABASES
+
+# Без POSTGRES_DB тесты идут на SQLite; проверки, которым нужен
+# PostgreSQL (планы запросов, полнотекстовый поиск), при этом пропускаются.
+if not os.getenv("POSTGRES_DB"):
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    }
+
+# Вторая база для тестов маршрутизации чтения (api.replicas): в тестах
+# это та же база, реплики включаются через override_settings.
+DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+REPLICA_DATABASES = []
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix="foodgram-test-media-")
+RECIPE_IMAGE_VARIANTS_SYNC = True
+SIMILAR_RECIPES_SYNC = True
+
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
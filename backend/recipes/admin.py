@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.contrib.admin import display
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
 
 from .models import (Carts, CountIngredient, Favourites, Ingredients, Recipes,
-                     Tags)
+                     ShoppingLists, Tags)
+from .search import search_recipes
 
 
 @admin.register(Tags)
@@ -16,15 +18,35 @@ class IngredientAdmin(admin.ModelAdmin):
     search_fields = ("name",)
 
 
+class SearchChangeList(ChangeList):
+    """Найденные рецепты идут по релевантности, пока не выбрана
+    сортировка по столбцу: иначе её перекрыл бы порядок модели."""
+
+    def get_ordering(self, request, queryset):
+        if (self.query and queryset.query.order_by
+                and ORDER_VAR not in self.params):
+            return list(queryset.query.order_by)
+        return super().get_ordering(request, queryset)
+
+
 @admin.register(Recipes)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ("author", "name", "count_favorites")
     list_filter = ("author", "tags")
     search_fields = ("name",)
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по тому же индексу, что и ?search= в API."""
+        if not search_term:
+            return queryset, False
+        return search_recipes(queryset, search_term), False
+
+    def get_changelist(self, request, **kwargs):
+        return SearchChangeList
+
     @display(description="Количество в избранных")
     def count_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 @admin.register(Carts)
@@ -32,6 +54,11 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ("user", "recipe",)
 
 
+@admin.register(ShoppingLists)
+class ShoppingListAdmin(admin.ModelAdmin):
+    list_display = ("user", "ingredient", "amount", "recipes_count",)
+
+
 @admin.register(Favourites)
 class FavouriteAdmin(admin.ModelAdmin):
     list_display = ("user", "recipe",)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class RecipesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "recipes"
+
+    def ready(self):
+        from recipes.counters import connect_counters
+        from recipes.search import connect_search_index
+        from recipes.shopping_lists import connect_shopping_lists
+        connect_counters()
+        connect_search_index()
+        connect_shopping_lists()
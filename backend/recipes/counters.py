@@ -0,0 +1,176 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+
+from recipes.models import Carts, Favourites, Recipes
+from users.models import Subscribers
+
+User = get_user_model()
+
+# (модель со счётчиком, поле счётчика, считаемая модель, внешний ключ)
+COUNTERS = (
+    (Recipes, "favorites_count", Favourites, "recipe"),
+    (Recipes, "carts_count", Carts, "recipe"),
+    (User, "recipes_count", Recipes, "author"),
+    (User, "subscribers_count", Subscribers, "author"),
+)
+
+_bulk = threading.local()
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменить счётчик, не опуская его ниже нуля."""
+    if pk is None:
+        return
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def change_counters(model, pks, field, delta):
+    """Изменить счётчик у нескольких объектов одним запросом."""
+    if pks:
+        model.objects.filter(pk__in=pks).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+
+
+def returns_rows(connection):
+    """Поддерживает ли база INSERT/DELETE ... RETURNING."""
+    if connection.vendor == "postgresql":
+        return True
+    return (connection.vendor == "sqlite"
+            and sqlite3.sqlite_version_info >= (3, 35))
+
+
+def add_links(model, user_id, recipe_ids):
+    """Добавить строки (пользователь, рецепт); вернуть id рецептов, чьи
+    строки вставлены этим вызовом.
+
+    Строки, которые успел вставить параллельный запрос, в ответ не
+    попадают: от ответа считаются счётчики и списки покупок.
+    """
+    if not recipe_ids:
+        return []
+    connection = connections[router.db_for_write(model)]
+    if not returns_rows(connection):
+        added = []
+        for recipe_id in recipe_ids:
+            try:
+                with transaction.atomic(using=connection.alias):
+                    model.objects.create(user_id=user_id,
+                                         recipe_id=recipe_id)
+            except IntegrityError:
+                continue
+            added.append(recipe_id)
+        return added
+    quote = connection.ops.quote_name
+    values = ", ".join(["(%s, %s)"] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(model._meta.db_table)} "
+            f"({quote('user_id')}, {quote('recipe_id')}) VALUES {values} "
+            f"ON CONFLICT DO NOTHING RETURNING {quote('recipe_id')}",
+            [value for recipe_id in recipe_ids
+             for value in (user_id, recipe_id)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def remove_links(model, user_id, recipe_ids):
+    """Удалить строки (пользователь, рецепт); вернуть id рецептов, чьи
+    строки удалены этим вызовом."""
+    if not recipe_ids:
+        return []
+    connection = connections[router.db_for_write(model)]
+    if not returns_rows(connection):
+        return [recipe_id for recipe_id in recipe_ids
+                if model.objects.filter(user_id=user_id,
+                                        recipe_id=recipe_id).delete()[0]]
+    quote = connection.ops.quote_name
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(model._meta.db_table)} "
+            f"WHERE {quote('user_id')} = %s "
+            f"AND {quote('recipe_id')} IN ({placeholders}) "
+            f"RETURNING {quote('recipe_id')}",
+            [user_id, *recipe_ids],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+@contextmanager
+def bulk_counters():
+    """Не менять счётчики и списки покупок по сигналам внутри блока.
+
+    Для массовых операций: вызывающий код сам меняет счётчики через
+    change_counters, а списки покупок - через recipes.shopping_lists.
+    """
+    previous = getattr(_bulk, "active", False)
+    _bulk.active = True
+    try:
+        yield
+    finally:
+        _bulk.active = previous
+
+
+def bulk_active():
+    return getattr(_bulk, "active", False)
+
+
+def actual_count(counted, fk):
+    """Подзапрос с настоящим количеством строк для OuterRef("pk")."""
+    return Coalesce(
+        Subquery(
+            counted.objects.filter(**{fk: OuterRef("pk")})
+            .order_by()
+            .values(fk)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def reconcile(batch_size=1000):
+    """Исправить расхождения счётчиков; вернуть число исправлений."""
+    fixed = {}
+    for model, field, counted, fk in COUNTERS:
+        drifted = []
+        rows = model.objects.order_by().annotate(
+            actual=actual_count(counted, fk)
+        ).exclude(**{field: F("actual")}).values_list("pk", "actual")
+        for pk, actual in rows.iterator(chunk_size=batch_size):
+            drifted.append(model(pk=pk, **{field: actual}))
+        model.objects.bulk_update(drifted, [field], batch_size=batch_size)
+        fixed[f"{model._meta.model_name}.{field}"] = len(drifted)
+    return fixed
+
+
+def connect_counter(model, field, counted, fk):
+    def created(sender, instance, created, **kwargs):
+        if created and not bulk_active():
+            change_counter(model, getattr(instance, f"{fk}_id"), field, 1)
+
+    def deleted(sender, instance, **kwargs):
+        if bulk_active():
+            return
+        change_counter(model, getattr(instance, f"{fk}_id"), field, -1)
+
+    uid = f"{model._meta.label}.{field}"
+    post_save.connect(created, sender=counted, weak=False,
+                      dispatch_uid=f"{uid}.created")
+    post_delete.connect(deleted, sender=counted, weak=False,
+                        dispatch_uid=f"{uid}.deleted")
+
+
+def connect_counters():
+    for counter in COUNTERS:
+        connect_counter(*counter)
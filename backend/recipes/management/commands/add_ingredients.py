@@ -1,17 +1,85 @@
 import csv
+import json
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from api.ingredient_index import bump_index_version
+from api.response_cache import invalidate
 from recipes.models import Ingredients
 
+DEFAULT_PATH = Path(settings.BASE_DIR) / "data" / "ingredients.csv"
+
+
+def read_rows(path):
+    """Пары (название, единица измерения) из CSV или JSON."""
+    if path.suffix == ".json":
+        with open(path, encoding="utf-8") as file:
+            for item in json.load(file):
+                yield item["name"].strip(), item["measurement_unit"].strip()
+        return
+    with open(path, encoding="utf-8") as file:
+        for row in csv.reader(file):
+            if len(row) >= 2:
+                yield row[0].strip(), row[1].strip()
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
 
 class Command(BaseCommand):
-    help = "add_ingredients"
+    help = "Загрузка ингредиентов без удаления существующих"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", type=Path, default=DEFAULT_PATH,
+                            help="CSV или JSON файл с ингредиентами")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Только посчитать изменения")
 
     def handle(self, *args, **options):
-        Ingredients.objects.all().delete()
-        with open('data/ingredients.csv', 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                Ingredients.objects.create(name=row[0],
-                                           measurement_unit=row[1])
+        path = options["path"]
+        batch_size = options["batch_size"]
+        if not path.exists():
+            raise CommandError(f"Файл {path} не найден.")
+        if batch_size < 1:
+            raise CommandError("--batch-size должен быть больше нуля.")
+
+        inserted = unchanged = 0
+        seen = set()
+        with transaction.atomic():
+            for chunk in chunks(read_rows(path), batch_size):
+                chunk = [row for row in dict.fromkeys(chunk)
+                         if row not in seen]
+                seen.update(chunk)
+                existing = set(Ingredients.objects.filter(
+                    name__in={name for name, _ in chunk}
+                ).values_list("name", "measurement_unit"))
+                new = [row for row in chunk if row not in existing]
+                unchanged += len(chunk) - len(new)
+                inserted += len(new)
+                if new and not options["dry_run"]:
+                    Ingredients.objects.bulk_create(
+                        [Ingredients(name=name, measurement_unit=unit)
+                         for name, unit in new],
+                        ignore_conflicts=True,
+                    )
+        if inserted and not options["dry_run"]:
+            # bulk_create не шлёт сигналов: индекс и кэш ответов
+            # сбрасываются здесь, через общий кэш - во всех процессах.
+            bump_index_version()
+            invalidate("ingredients")
+
+        prefix = "[dry-run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Добавлено: {inserted}, без изменений: {unchanged}."
+        ))
@@ -0,0 +1,90 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import compare, dump_baseline, isolated, load_baseline, run
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "data" / "benchmark_baseline.json"
+
+
+class Command(BaseCommand):
+    help = ("Замер задержки, числа запросов и размера ответа для всех "
+            "адресов API на синтетических данных во временной базе")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--recipes", type=int, default=200)
+        parser.add_argument("--ingredients", type=int, default=300)
+        parser.add_argument("--tags", type=int, default=6)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+        parser.add_argument("--update-baseline", action="store_true",
+                            help="Записать результаты как базовые")
+        parser.add_argument("--output", type=Path,
+                            help="Сохранить результаты в JSON")
+        parser.add_argument("--latency-threshold", type=float, default=1.0,
+                            help="Допустимый рост p95, доля (1.0 = +100%%)")
+        parser.add_argument("--latency-floor", type=float, default=10.0,
+                            help="Рост p95 меньше этого числа мс не считается")
+        parser.add_argument("--size-threshold", type=float, default=0.1,
+                            help="Допустимый рост размера ответа, доля")
+        parser.add_argument("--query-slack", type=int, default=0,
+                            help="Допустимый рост числа запросов")
+        parser.add_argument("--noinput", action="store_false",
+                            dest="interactive")
+
+    def handle(self, *args, **options):
+        dataset = {
+            "users": options["users"],
+            "recipes": options["recipes"],
+            "ingredients": options["ingredients"],
+            "tags": options["tags"],
+            "random_seed": options["seed"],
+        }
+        results = self.run_isolated(dataset, options)
+
+        width = max(map(len, results))
+        self.stdout.write(
+            f"{'endpoint':<{width}}  {'p50 ms':>9} {'p95 ms':>9} "
+            f"{'queries':>7} {'bytes':>9}")
+        for name, metrics in results.items():
+            self.stdout.write(
+                f"{name:<{width}}  {metrics['p50_ms']:>9.2f} "
+                f"{metrics['p95_ms']:>9.2f} {metrics['queries']:>7} "
+                f"{metrics['bytes']:>9}")
+
+        if options["output"]:
+            options["output"].write_text(
+                json.dumps(results, ensure_ascii=False, indent=2),
+                encoding="utf-8")
+        if options["update_baseline"]:
+            dump_baseline(options["baseline"], results, dataset,
+                          options["repeat"])
+            self.stdout.write(self.style.SUCCESS(
+                f"Базовые значения записаны в {options['baseline']}"))
+            return
+        if not options["baseline"].exists():
+            self.stdout.write(self.style.WARNING(
+                "Базовых значений нет, сравнение пропущено."))
+            return
+
+        regressions = compare(
+            results,
+            load_baseline(options["baseline"]),
+            options["latency_threshold"],
+            options["size_threshold"],
+            options["query_slack"],
+            options["latency_floor"],
+        )
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            raise CommandError(f"Регрессий: {len(regressions)}")
+        self.stdout.write(self.style.SUCCESS("Регрессий нет."))
+
+    def run_isolated(self, dataset, options):
+        return isolated(lambda: run(repeat=options["repeat"], **dataset),
+                        options["interactive"])
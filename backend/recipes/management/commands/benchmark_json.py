@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from api.benchmark import isolated, run_json
+from api.renderers import orjson
+
+
+class Command(BaseCommand):
+    help = ("Сравнение стандартного json и orjson: рендер страницы "
+            "рецептов и разбор тела создания рецепта")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=100)
+        parser.add_argument("--image-size", type=int, default=1024,
+                            help="Размер картинки в теле запроса, КиБ")
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--noinput", action="store_false",
+                            dest="interactive")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                "orjson не установлен: быстрые классы работают на json."))
+        results, same = isolated(
+            lambda: run_json(repeat=options["repeat"],
+                             recipes=options["recipes"],
+                             image_size=options["image_size"] * 1024,
+                             random_seed=options["seed"]),
+            options["interactive"],
+        )
+        width = max(map(len, results))
+        self.stdout.write(f"{'':<{width}}  {'median ms':>9} "
+                          f"{'peak KiB':>9} {'bytes':>9}")
+        for name, metrics in results.items():
+            self.stdout.write(
+                f"{name:<{width}}  {metrics['median_ms']:>9.3f} "
+                f"{metrics['peak_kib']:>9.1f} {metrics['bytes']:>9}")
+        for action in ("render", "parse"):
+            standard = results[f"{action} json"]["median_ms"]
+            fast = results[f"{action} fast"]["median_ms"]
+            self.stdout.write(
+                f"{action}: быстрее в {standard / fast:.1f} раза")
+        if same:
+            self.stdout.write(self.style.SUCCESS(
+                "Вывод рендереров на странице рецептов совпадает "
+                "байт в байт."))
+        else:
+            self.stdout.write(self.style.ERROR(
+                "Вывод рендереров отличается."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes.shopping_lists import rebuild
+
+
+class Command(BaseCommand):
+    help = "Пересчёт списков покупок пользователей по корзинам"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = rebuild(options["batch_size"])
+        self.stdout.write(f"Строк в списках покупок: {rows}")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Пересчёт счётчиков рецептов, избранного, корзин и подписчиков"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for counter, fixed in reconcile(options["batch_size"]).items():
+            self.stdout.write(f"{counter}: исправлено {fixed}")
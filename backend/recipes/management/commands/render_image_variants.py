@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.images import render_variants
+from recipes.models import Recipes
+
+
+class Command(BaseCommand):
+    help = "Построение уменьшенных копий картинок рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true",
+                            help="Перестроить и уже готовые копии")
+
+    def handle(self, *args, **options):
+        recipes = Recipes.objects.exclude(image="")
+        if not options["all"]:
+            recipes = recipes.filter(image_variants={})
+        done = 0
+        for recipe_id in recipes.values_list("id", flat=True).iterator():
+            if render_variants(recipe_id):
+                done += 1
+        self.stdout.write(f"Готово: {done}")
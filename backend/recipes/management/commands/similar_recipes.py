@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from api.similar_recipes import compute_all
+
+
+class Command(BaseCommand):
+    help = ("Пересчёт похожих рецептов: косинусное сходство векторов "
+            "ингредиентов и тегов, пачками по --batch-size рецептов")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=256)
+        parser.add_argument("--count", type=int,
+                            help="Сколько соседей хранить для рецепта")
+
+    def handle(self, *args, **options):
+        total = compute_all(options["batch_size"], options["count"])
+        self.stdout.write(f"Рецептов обработано: {total}")
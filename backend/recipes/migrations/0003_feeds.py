@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_feeds(apps, schema_editor):
+    """Ленты по уже существующим подпискам: последние рецепты каждого
+    автора, как при новой подписке (api.feed.backfill)."""
+    Feeds = apps.get_model("recipes", "Feeds")
+    Recipes = apps.get_model("recipes", "Recipes")
+    Subscribers = apps.get_model("users", "Subscribers")
+    size = getattr(settings, "FEED_BACKFILL_SIZE", 20)
+    for user_id, author_id in Subscribers.objects.values_list(
+        "user_id", "author_id"
+    ).iterator():
+        Feeds.objects.bulk_create(
+            [Feeds(user_id=user_id, recipe_id=recipe_id, date=date)
+             for recipe_id, date in Recipes.objects.filter(
+                 author_id=author_id
+             ).order_by("-date").values_list("id", "date")[:size]],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_recipes_carts_count_recipes_favorites_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Feeds',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(verbose_name='Дата публикации рецепта')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feeds', to='recipes.recipes', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Лента',
+                'verbose_name_plural': 'Ленты',
+                'indexes': [models.Index(fields=['user', '-date'], name='feed_user_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='feeds',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='Unique recipe in feed'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:51
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """Оставить по одной записи (user, recipe) перед уникальным индексом."""
+    Recipes = apps.get_model("recipes", "Recipes")
+    for model_name, counter in (("Carts", "carts_count"),
+                                ("Favourites", "favorites_count")):
+        model = apps.get_model("recipes", model_name)
+        duplicates = model.objects.values("user", "recipe").annotate(
+            keep=Min("id"), total=Count("id")
+        ).filter(total__gt=1)
+        for row in duplicates:
+            model.objects.filter(
+                user=row["user"], recipe=row["recipe"]
+            ).exclude(id=row["keep"]).delete()
+            Recipes.objects.filter(id=row["recipe"]).update(
+                **{counter: model.objects.filter(
+                    recipe=row["recipe"]).count()}
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_feeds'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['author', '-date'], name='recipe_author_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['-date', '-id'], name='recipe_date_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='carts',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='Unique recipe in cart'),
+        ),
+        migrations.AddConstraint(
+            model_name='favourites',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='Unique recipe in favorites'),
+        ),
+        migrations.RunSQL(
+            "CREATE INDEX recipe_tags_tag_recipe_idx "
+            "ON recipes_recipes_tags (tags_id, recipes_id);",
+            "DROP INDEX recipe_tags_tag_recipe_idx;",
+        ),
+    ]
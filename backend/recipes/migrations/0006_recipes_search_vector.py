@@ -0,0 +1,128 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:10
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Вектор рецепта: название (A), ингредиенты (B) и описание (C)
+CREATE_SEARCH = """
+CREATE FUNCTION recipes_search_document(recipe bigint, title text, body text)
+RETURNS tsvector LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('russian', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_countingredient AS amount
+            JOIN recipes_ingredients AS ingredient
+                ON ingredient.id = amount.ingredient_id
+            WHERE amount.recipe_id = recipe
+        ), '')), 'B')
+        || setweight(to_tsvector('russian', coalesce(body, '')), 'C')
+$$;
+
+CREATE FUNCTION recipes_search_recipe() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := recipes_search_document(NEW.id, NEW.name, NEW.text);
+    RETURN NEW;
+END
+$$;
+
+CREATE TRIGGER recipes_search_recipe
+BEFORE INSERT OR UPDATE OF name, text ON recipes_recipes
+FOR EACH ROW EXECUTE PROCEDURE recipes_search_recipe();
+
+CREATE FUNCTION recipes_search_amounts() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE recipes_recipes
+        SET search_vector = recipes_search_document(id, name, text)
+        WHERE id IN (SELECT recipe_id FROM new_rows);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE recipes_recipes
+        SET search_vector = recipes_search_document(id, name, text)
+        WHERE id IN (SELECT recipe_id FROM new_rows
+                     UNION SELECT recipe_id FROM old_rows);
+    ELSE
+        UPDATE recipes_recipes
+        SET search_vector = recipes_search_document(id, name, text)
+        WHERE id IN (SELECT recipe_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER recipes_search_amounts_insert
+AFTER INSERT ON recipes_countingredient
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE recipes_search_amounts();
+
+CREATE TRIGGER recipes_search_amounts_update
+AFTER UPDATE ON recipes_countingredient
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE recipes_search_amounts();
+
+CREATE TRIGGER recipes_search_amounts_delete
+AFTER DELETE ON recipes_countingredient
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE recipes_search_amounts();
+
+CREATE FUNCTION recipes_search_ingredient() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE recipes_recipes
+    SET search_vector = recipes_search_document(id, name, text)
+    WHERE id IN (SELECT recipe_id FROM recipes_countingredient
+                 WHERE ingredient_id = NEW.id);
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER recipes_search_ingredient
+AFTER UPDATE OF name ON recipes_ingredients
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE PROCEDURE recipes_search_ingredient();
+
+UPDATE recipes_recipes
+SET search_vector = recipes_search_document(id, name, text);
+
+CREATE INDEX recipe_search_idx ON recipes_recipes USING gin (search_vector);
+"""
+
+DROP_SEARCH = """
+DROP INDEX recipe_search_idx;
+DROP TRIGGER recipes_search_ingredient ON recipes_ingredients;
+DROP TRIGGER recipes_search_amounts_delete ON recipes_countingredient;
+DROP TRIGGER recipes_search_amounts_update ON recipes_countingredient;
+DROP TRIGGER recipes_search_amounts_insert ON recipes_countingredient;
+DROP TRIGGER recipes_search_recipe ON recipes_recipes;
+DROP FUNCTION recipes_search_ingredient();
+DROP FUNCTION recipes_search_amounts();
+DROP FUNCTION recipes_search_recipe();
+DROP FUNCTION recipes_search_document(bigint, text, text);
+"""
+
+
+def run_on_postgresql(sql):
+    """Триггеры и GIN-индекс есть только в PostgreSQL, другие базы
+    используют индекс в памяти (recipes.search)."""
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor == "postgresql":
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipes_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(run_on_postgresql(CREATE_SEARCH),
+                             run_on_postgresql(DROP_SEARCH)),
+    ]
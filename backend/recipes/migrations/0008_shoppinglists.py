@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_lists(apps, schema_editor):
+    CountIngredient = apps.get_model("recipes", "CountIngredient")
+    ShoppingLists = apps.get_model("recipes", "ShoppingLists")
+    rows = CountIngredient.objects.filter(
+        recipe__cart__isnull=False
+    ).order_by().values(
+        "recipe__cart__user_id", "ingredient_id"
+    ).annotate(
+        total=models.Sum("amount"), recipes=models.Count("id")
+    ).values_list("recipe__cart__user_id", "ingredient_id", "total",
+                  "recipes")
+    ShoppingLists.objects.bulk_create(
+        [ShoppingLists(user_id=user_id, ingredient_id=ingredient_id,
+                       amount=amount, recipes_count=recipes)
+         for user_id, ingredient_id, amount, recipes in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0007_neighbours'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingLists',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('recipes_count', models.PositiveIntegerField(default=0, verbose_name='Количество рецептов')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_lists', to='recipes.ingredients', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент в списке покупок',
+                'verbose_name_plural': 'Списки покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglists',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='Unique ingredient in shopping list'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
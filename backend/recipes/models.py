@@ -1,8 +1,10 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import (RegexValidator,
                                     MinValueValidator,
                                     MaxValueValidator)
 from django.db import models
+from django.db.models import Prefetch
 
 User = get_user_model()
 
@@ -52,6 +54,35 @@ class Ingredients(models.Model):
         return f"Название ингредиента: {self.name}"
 
 
+class RecipesQuerySet(models.QuerySet):
+    """Выборки рецептов для вывода списком."""
+
+    def with_related(self, fields=None):
+        """Подгрузить автора, теги и ингредиенты пачкой.
+
+        При заданных fields подгружается только то, что будет выведено,
+        а большие невыводимые столбцы не читаются.
+        """
+        queryset = self
+        if fields is None:
+            fields = ("author", "tags", "ingredients")
+        else:
+            queryset = queryset.defer(*({"text", "image_variants"} - fields))
+        if "author" in fields:
+            queryset = queryset.select_related("author")
+        lookups = []
+        if "tags" in fields:
+            lookups.append("tags")
+        if "ingredients" in fields:
+            lookups.append(Prefetch(
+                "ingredients_for_recipe",
+                queryset=CountIngredient.objects.select_related(
+                    "ingredient"
+                ).order_by("ingredient__name"),
+            ))
+        return queryset.prefetch_related(*lookups)
+
+
 class Recipes(models.Model):
     """Модель рецептов."""
     author = models.ForeignKey(
@@ -64,6 +95,9 @@ class Recipes(models.Model):
     name = models.CharField("Название", max_length=200)
     image = models.ImageField("Картинка",
                               upload_to="recipes/")
+    image_variants = models.JSONField(
+        "Уменьшенные копии картинки", default=dict, editable=False
+    )
     text = models.TextField("Текстовое описание")
     ingredients = models.ManyToManyField(
         Ingredients,
@@ -82,11 +116,40 @@ class Recipes(models.Model):
         ]
     )
     date = models.DateTimeField("Дата публикации", auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        "Количество в избранных", default=0, editable=False
+    )
+    carts_count = models.PositiveIntegerField(
+        "Количество в корзинах", default=0, editable=False
+    )
+    # В PostgreSQL заполняется триггером (миграция 0006)
+    search_vector = SearchVectorField(
+        "Поисковый вектор", null=True, editable=False
+    )
+
+    objects = RecipesQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ("-date",)
+        indexes = [
+            models.Index(fields=("author", "-date"),
+                         name="recipe_author_date_idx"),
+            models.Index(fields=("-date", "-id"), name="recipe_date_id_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Счётчики меняются только через F(), поисковый вектор - триггером,
+        сохранение их не затирает."""
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ("favorites_count", "carts_count",
+                                       "search_vector")
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         # return f"Название: {self.name}\n Автор: {self.author.username}"
@@ -112,6 +175,12 @@ class Carts(models.Model):
     class Meta:
         verbose_name = "Корзина"
         verbose_name_plural = "Корзины"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "recipe"),
+                name="Unique recipe in cart"
+            )
+        ]
 
     def __str__(self):
         return (
@@ -137,12 +206,122 @@ class Favourites(models.Model):
 
     class Meta:
         verbose_name = "Избранное"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "recipe"),
+                name="Unique recipe in favorites"
+            )
+        ]
 
     def __str__(self):
         return (f"{self.recipe.name} --> {self.user.username}")
         # return (f"{self.recipe.name}")
 
 
+class Feeds(models.Model):
+    """Модель ленты рецептов от авторов, на которых подписан пользователь."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed",
+        verbose_name="Подписчик",
+    )
+    recipe = models.ForeignKey(
+        Recipes,
+        on_delete=models.CASCADE,
+        related_name="feeds",
+        verbose_name="Рецепт",
+    )
+    date = models.DateTimeField("Дата публикации рецепта")
+
+    class Meta:
+        verbose_name = "Лента"
+        verbose_name_plural = "Ленты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "recipe"),
+                name="Unique recipe in feed"
+            )
+        ]
+        indexes = [
+            models.Index(fields=("user", "-date"), name="feed_user_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe.name} --> {self.user.username}"
+
+
+class Neighbours(models.Model):
+    """Модель похожих рецептов, посчитанных заранее."""
+    recipe = models.ForeignKey(
+        Recipes,
+        on_delete=models.CASCADE,
+        related_name="neighbours",
+        verbose_name="Рецепт",
+    )
+    neighbour = models.ForeignKey(
+        Recipes,
+        on_delete=models.CASCADE,
+        related_name="neighbour_of",
+        verbose_name="Похожий рецепт",
+    )
+    score = models.FloatField("Сходство")
+
+    class Meta:
+        verbose_name = "Похожий рецепт"
+        verbose_name_plural = "Похожие рецепты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("recipe", "neighbour"),
+                name="Unique recipe neighbour"
+            )
+        ]
+        indexes = [
+            models.Index(fields=("recipe", "-score"),
+                         name="neighbour_recipe_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe.name} ~ {self.neighbour.name}"
+
+
+class ShoppingLists(models.Model):
+    """Модель списка покупок: суммы ингредиентов рецептов из корзины.
+
+    Меняется приращениями при изменении корзины и состава рецептов
+    (recipes.shopping_lists).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredients,
+        on_delete=models.CASCADE,
+        related_name="shopping_lists",
+        verbose_name="Ингредиент",
+    )
+    amount = models.PositiveIntegerField("Количество", default=0)
+    recipes_count = models.PositiveIntegerField(
+        "Количество рецептов", default=0
+    )
+
+    class Meta:
+        verbose_name = "Ингредиент в списке покупок"
+        verbose_name_plural = "Списки покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "ingredient"),
+                name="Unique ingredient in shopping list"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.ingredient.name} {self.amount}"
+
+
 class CountIngredient(models.Model):
     """Модель для количества ингредиентов в рецепте."""
 
@@ -0,0 +1,157 @@
+import re
+import threading
+import uuid
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, When
+from django.db.models.signals import post_delete, post_save
+
+SEARCH_CONFIG = "russian"
+SEARCH_VERSION_KEY = "recipes:search-version"
+# Веса совпадают с весами ts_rank для setweight A, B и C в триггере
+WEIGHTS = (("name", 1.0), ("ingredients", 0.4), ("text", 0.2))
+# Окончания для грубой замены русского стемминга в индексе процесса
+ENDINGS = tuple(sorted((
+    "ыми", "ими", "ого", "его", "ому", "ему", "ами", "ями", "ать", "ять",
+    "ить", "еть", "ая", "яя", "ое", "ее", "ые", "ие", "ый", "ий", "ой",
+    "ую", "юю", "ам", "ям", "ах", "ях", "ом", "ем", "ов", "ев", "ей", "ия",
+    "ье", "ья", "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+), key=len, reverse=True))
+WORD = re.compile(r"\w+")
+# Сколько лучших рецептов отдаёт индекс процесса: порядок задаётся
+# CASE с ветвью на каждый рецепт
+FALLBACK_LIMIT = 500
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def stem(word):
+    word = word.casefold().replace("ё", "е")
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def stems(text):
+    return [stem(word) for word in WORD.findall(text or "")]
+
+
+class RecipeSearchIndex:
+    """Обратный индекс рецептов в памяти процесса.
+
+    Замена поискового вектора PostgreSQL для других баз: слово
+    запроса должно встретиться в названии, ингредиентах или описании,
+    вес совпадения зависит от поля.
+    """
+
+    def __init__(self, documents):
+        self.postings = defaultdict(lambda: defaultdict(float))
+        for document in documents:
+            for field, weight in WEIGHTS:
+                for word in stems(document[field]):
+                    self.postings[word][document["id"]] += weight
+
+    def search(self, query):
+        """id рецептов со всеми словами запроса, лучшие первыми."""
+        words = set(stems(query))
+        if not words:
+            return []
+        scores = None
+        for word in words:
+            postings = self.postings.get(word, {})
+            if scores is None:
+                scores = dict(postings)
+            else:
+                scores = {recipe_id: score + postings[recipe_id]
+                          for recipe_id, score in scores.items()
+                          if recipe_id in postings}
+            if not scores:
+                return []
+        return sorted(scores, key=lambda recipe_id: (-scores[recipe_id],
+                                                     -recipe_id))
+
+
+def get_search_version():
+    version = cache.get(SEARCH_VERSION_KEY)
+    if version is None:
+        cache.add(SEARCH_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(SEARCH_VERSION_KEY)
+    return version
+
+
+def set_search_version():
+    cache.set(SEARCH_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def bump_search_version(**kwargs):
+    """Сменить версию сразу и ещё раз после фиксации транзакции: индекс,
+    построенный другим процессом до фиксации, не останется актуальным."""
+    set_search_version()
+    transaction.on_commit(set_search_version)
+
+
+def load_documents():
+    from recipes.models import CountIngredient, Recipes
+
+    ingredients = defaultdict(list)
+    for recipe_id, name in CountIngredient.objects.values_list(
+        "recipe_id", "ingredient__name"
+    ).iterator(chunk_size=2000):
+        ingredients[recipe_id].append(name)
+    for document in Recipes.objects.values(
+        "id", "name", "text"
+    ).iterator(chunk_size=2000):
+        document["ingredients"] = " ".join(ingredients[document["id"]])
+        yield document
+
+
+def get_search_index():
+    """Индекс процесса; перестраивается при смене версии в кэше."""
+    global _index, _index_version
+    version = get_search_version()
+    if _index is not None and _index_version == version:
+        return _index
+    with _lock:
+        if _index is None or _index_version != version:
+            _index = RecipeSearchIndex(load_documents())
+            _index_version = version
+    return _index
+
+
+def search_recipes(queryset, value):
+    """Рецепты по словам из названия, описания и ингредиентов,
+    от более подходящих к менее подходящим."""
+    if not value.strip():
+        return queryset
+    if connections[queryset.db].vendor == "postgresql":
+        query = SearchQuery(value, config=SEARCH_CONFIG,
+                            search_type="websearch")
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F("search_vector"), query)
+        ).order_by("-search_rank", "-date", "-id")
+    found = get_search_index().search(value)[:FALLBACK_LIMIT]
+    if not found:
+        return queryset.none()
+    return queryset.filter(id__in=found).order_by(Case(
+        *(When(id=recipe_id, then=position)
+          for position, recipe_id in enumerate(found)),
+        output_field=IntegerField(),
+    ))
+
+
+def connect_search_index():
+    """Индекс процесса устаревает при изменении рецептов и ингредиентов."""
+    from recipes.models import CountIngredient, Ingredients, Recipes
+
+    for model in (Recipes, CountIngredient, Ingredients):
+        uid = f"{model._meta.label}.search"
+        post_save.connect(bump_search_version, sender=model, weak=False,
+                          dispatch_uid=f"{uid}.saved")
+        post_delete.connect(bump_search_version, sender=model, weak=False,
+                            dispatch_uid=f"{uid}.deleted")
@@ -0,0 +1,147 @@
+import threading
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Sum
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from recipes.counters import bulk_active
+from recipes.models import Carts, CountIngredient, Recipes, ShoppingLists
+
+_deleting = threading.local()
+
+
+def recipe_amounts(recipe_ids, sign=1):
+    """Приращения {ингредиент: (количество, рецептов)} от рецептов."""
+    return {
+        ingredient_id: (sign * amount, sign * recipes)
+        for ingredient_id, amount, recipes in CountIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by().values("ingredient_id").annotate(
+            total=Sum("amount"), recipes=Count("id")
+        ).values_list("ingredient_id", "total", "recipes")
+    }
+
+
+def deltas_case(deltas, position):
+    """CASE по id ингредиента; собирается строкой, а не из When(): при
+    сотнях ингредиентов компиляция выражений Django заметно дольше
+    самого запроса."""
+    sql = " ".join(["WHEN %s THEN %s"] * len(deltas))
+    params = [value for ingredient_id, delta in deltas.items()
+              for value in (ingredient_id, delta[position])]
+    return RawSQL(f"CASE ingredient_id {sql} ELSE 0 END", params,
+                  output_field=IntegerField())
+
+
+def apply(user_ids, deltas):
+    """Прибавить приращения к спискам покупок пользователей.
+
+    Недостающие строки вставляются, суммы меняются одним UPDATE через
+    F(), строки без рецептов удаляются.
+    """
+    deltas = {ingredient_id: delta for ingredient_id, delta in deltas.items()
+              if any(delta)}
+    if not user_ids or not deltas:
+        return
+    with transaction.atomic(savepoint=False):
+        ShoppingLists.objects.bulk_create(
+            [ShoppingLists(user_id=user_id, ingredient_id=ingredient_id)
+             for user_id in user_ids
+             for ingredient_id, (_, recipes) in deltas.items()
+             if recipes > 0],
+            ignore_conflicts=True,
+        )
+        rows = ShoppingLists.objects.filter(user_id__in=user_ids,
+                                            ingredient_id__in=deltas)
+        rows.update(
+            amount=Greatest(F("amount") + deltas_case(deltas, 0), 0),
+            recipes_count=Greatest(
+                F("recipes_count") + deltas_case(deltas, 1), 0),
+        )
+        if any(recipes < 0 for _, recipes in deltas.values()):
+            rows.filter(recipes_count=0).delete()
+
+
+def cart_changed(user_id, recipe_ids, sign):
+    """Рецепты добавлены в корзину (sign=1) или убраны из неё (-1).
+
+    recipe_ids - только рецепты, чьи строки корзины действительно
+    вставлены или удалены (recipes.counters.add_links, remove_links):
+    иначе параллельные запросы учтут одно изменение дважды.
+    """
+    apply([user_id], recipe_amounts(recipe_ids, sign))
+
+
+def recipe_ingredients_changed(recipe, deltas):
+    """Состав рецепта изменился: поправить списки всех, у кого он
+    в корзине."""
+    apply(list(Carts.objects.filter(recipe=recipe).values_list(
+        "user_id", flat=True)), deltas)
+
+
+def rebuild(batch_size=1000):
+    """Пересчитать все списки покупок по корзинам; вернуть число строк."""
+    rows = CountIngredient.objects.filter(
+        recipe__cart__isnull=False
+    ).order_by().values(
+        "recipe__cart__user_id", "ingredient_id"
+    ).annotate(total=Sum("amount"), recipes=Count("id")).values_list(
+        "recipe__cart__user_id", "ingredient_id", "total", "recipes"
+    )
+    rows = rows.iterator(chunk_size=batch_size)
+    with transaction.atomic():
+        ShoppingLists.objects.all().delete()
+        while True:
+            batch = [ShoppingLists(user_id=user_id,
+                                   ingredient_id=ingredient_id,
+                                   amount=amount, recipes_count=recipes)
+                     for user_id, ingredient_id, amount, recipes
+                     in islice(rows, batch_size)]
+            if not batch:
+                break
+            ShoppingLists.objects.bulk_create(batch)
+    return ShoppingLists.objects.count()
+
+
+def deleting_recipes():
+    if not hasattr(_deleting, "recipes"):
+        _deleting.recipes = set()
+    return _deleting.recipes
+
+
+def recipe_deleting(sender, instance, **kwargs):
+    # Строки корзины удаляются каскадом до или после ингредиентов рецепта,
+    # поэтому рецепт вычитается из списков сразу и один раз.
+    recipe_ingredients_changed(instance,
+                               recipe_amounts([instance.pk], -1))
+    deleting_recipes().add(instance.pk)
+
+
+def recipe_deleted(sender, instance, **kwargs):
+    deleting_recipes().discard(instance.pk)
+
+
+def cart_saved(sender, instance, created, **kwargs):
+    if created and not bulk_active():
+        cart_changed(instance.user_id, [instance.recipe_id], 1)
+
+
+def cart_deleted(sender, instance, **kwargs):
+    if bulk_active() or instance.recipe_id in deleting_recipes():
+        return
+    cart_changed(instance.user_id, [instance.recipe_id], -1)
+
+
+def connect_shopping_lists():
+    uid = "recipes.shopping_lists"
+    pre_delete.connect(recipe_deleting, sender=Recipes, weak=False,
+                       dispatch_uid=f"{uid}.recipe_deleting")
+    post_delete.connect(recipe_deleted, sender=Recipes, weak=False,
+                        dispatch_uid=f"{uid}.recipe_deleted")
+    post_save.connect(cart_saved, sender=Carts, weak=False,
+                      dispatch_uid=f"{uid}.cart_saved")
+    post_delete.connect(cart_deleted, sender=Carts, weak=False,
+                        dispatch_uid=f"{uid}.cart_deleted")
@@ -0,0 +1,117 @@
+import pytest
+from django.conf import settings
+from django.core.cache import caches
+from mixer.backend.django import mixer
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import local_tokens
+from recipes.models import CountIngredient, Ingredients, Recipes, Tags
+
+# Картинка 1x1 PNG для создания рецептов через API
+IMAGE = ("data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJ"
+         "AAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==")
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Кэши живут в процессе между тестами: каждый тест начинает
+    с пустых."""
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    local_tokens.clear()
+
+
+def client_for(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client
+
+
+@pytest.fixture
+def user(django_user_model):
+    return mixer.blend(django_user_model)
+
+
+@pytest.fixture
+def another_user(django_user_model):
+    return mixer.blend(django_user_model)
+
+
+@pytest.fixture
+def admin_user(django_user_model):
+    """Администратор для admin_client: у модели пользователя вход по
+    email, а username обязателен."""
+    return django_user_model.objects.create_superuser(
+        email="admin@example.com", username="admin", password="admin")
+
+
+@pytest.fixture
+def anon_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    return client_for(user)
+
+
+@pytest.fixture
+def another_user_client(another_user):
+    return client_for(another_user)
+
+
+@pytest.fixture
+def tags():
+    return [Tags.objects.create(name=f"Тег {i}", color=f"#00000{i}",
+                                slug=f"tag{i}")
+            for i in range(3)]
+
+
+@pytest.fixture
+def ingredients():
+    return [Ingredients.objects.create(name=f"ингредиент {i:02d}",
+                                       measurement_unit="г")
+            for i in range(10)]
+
+
+@pytest.fixture
+def make_recipe(tags, ingredients):
+    """Рецепт автора с тегами и тремя ингредиентами, без API."""
+    def make(author, number=0, **kwargs):
+        recipe = Recipes.objects.create(
+            author=author, name=kwargs.pop("name", f"Рецепт {number}"),
+            text=kwargs.pop("text", "Описание"), cooking_time=10,
+            image="recipes/test.png",
+            **kwargs,
+        )
+        recipe.tags.set(tags[:1 + number % len(tags)])
+        CountIngredient.objects.bulk_create([
+            CountIngredient(recipe=recipe,
+                            ingredient=ingredients[(number + i)
+                                                   % len(ingredients)],
+                            amount=10 * (i + 1))
+            for i in range(3)
+        ])
+        return recipe
+    return make
+
+
+@pytest.fixture
+def recipes(user, another_user, make_recipe):
+    return [make_recipe(user if number % 2 else another_user, number)
+            for number in range(6)]
+
+
+@pytest.fixture
+def recipe_data(tags, ingredients):
+    return {
+        "name": "Новый рецепт",
+        "text": "Описание",
+        "cooking_time": 30,
+        "image": IMAGE,
+        "tags": [tags[0].id, tags[1].id],
+        "ingredients": [{"id": ingredients[0].id, "amount": 100},
+                        {"id": ingredients[1].id, "amount": 50}],
+    }
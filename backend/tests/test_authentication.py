@@ -0,0 +1,83 @@
+import pytest
+from rest_framework.authtoken.models import Token
+
+from api.authentication import CachedTokenAuthentication
+from tests.conftest import client_for
+from users.models import Subscribers
+
+pytestmark = pytest.mark.django_db
+
+
+def test_repeat_requests_do_not_query_token(user_client,
+                                            django_assert_num_queries):
+    user_client.get("/api/users/me/")
+
+    with django_assert_num_queries(0):
+        response = user_client.get("/api/users/me/")
+
+    assert response.status_code == 200
+
+
+def test_logout_revokes_cached_token(user_client):
+    assert user_client.get("/api/users/me/").status_code == 200
+
+    assert user_client.post("/api/auth/token/logout/").status_code == 204
+
+    assert user_client.get("/api/users/me/").status_code == 401
+
+
+def test_deactivated_user_is_rejected(user, user_client):
+    user_client.get("/api/users/me/")
+    user.is_active = False
+    user.save()
+
+    assert user_client.get("/api/users/me/").status_code == 401
+
+
+def test_cached_user_reads_counters_from_database(user, another_user):
+    key = Token.objects.create(user=user).key
+    authentication = CachedTokenAuthentication()
+    authentication.authenticate_credentials(key)
+    Subscribers.objects.create(user=another_user, author=user)
+
+    cached, _ = authentication.authenticate_credentials(key)
+
+    assert cached.subscribers_count == 1
+
+
+@pytest.fixture
+def admin_api_client(admin_user):
+    """PATCH /api/users/me/ требует права на изменение пользователей."""
+    return client_for(admin_user)
+
+
+def test_write_does_not_restore_stale_cached_user(admin_user,
+                                                  admin_api_client):
+    admin_api_client.get("/api/users/me/")
+    # Пароль и активность изменены в другом процессе: кэш этого
+    # процесса о них не знает.
+    type(admin_user).objects.filter(pk=admin_user.pk).update(
+        password="changed", is_active=False)
+
+    response = admin_api_client.patch("/api/users/me/",
+                                      {"first_name": "Новое"},
+                                      format="json")
+
+    assert response.status_code == 401
+    admin_user.refresh_from_db()
+    assert (admin_user.password, admin_user.is_active) == ("changed", False)
+
+
+def test_write_saves_fresh_user(admin_user, admin_api_client):
+    admin_api_client.get("/api/users/me/")
+    type(admin_user).objects.filter(pk=admin_user.pk).update(
+        password="changed")
+
+    response = admin_api_client.patch("/api/users/me/",
+                                      {"first_name": "Новое"},
+                                      format="json")
+
+    assert response.status_code == 200
+    admin_user.refresh_from_db()
+    assert (admin_user.password, admin_user.first_name) == ("changed",
+                                                            "Новое")
@@ -0,0 +1,156 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from mixer.backend.django import mixer
+
+from api import views
+from recipes.models import Carts, Favourites, Recipes, ShoppingLists
+from recipes.shopping_lists import rebuild
+from users.models import Subscribers
+
+pytestmark = pytest.mark.django_db
+
+KINDS = [
+    ("/api/recipes/shopping_cart/bulk/", Carts, "carts_count"),
+    ("/api/recipes/favorite/bulk/", Favourites, "favorites_count"),
+]
+
+
+def race(monkeypatch, name, compete):
+    """Перед первым вызовом views.<name> выполнить конкурирующий запрос:
+    проверка присутствия у первого запроса к этому моменту устарела."""
+    real = getattr(views, name)
+    state = {"raced": False}
+
+    def racing(*args):
+        if not state["raced"]:
+            state["raced"] = True
+            compete()
+        return real(*args)
+    monkeypatch.setattr(views, name, racing)
+
+
+def statuses(response):
+    return {item["id"]: item["status"] for item in response.data["results"]}
+
+
+def assert_counters(model, counter, recipes):
+    for recipe in Recipes.objects.filter(pk__in=[r.pk for r in recipes]):
+        assert getattr(recipe, counter) == model.objects.filter(
+            recipe=recipe).count()
+
+
+@pytest.mark.parametrize("url, model, counter", KINDS)
+def test_overlapping_adds_count_each_row_once(monkeypatch, user_client,
+                                              recipes, url, model, counter):
+    ids = [recipe.pk for recipe in recipes]
+    competing = {}
+    race(monkeypatch, "add_links", lambda: competing.update(
+        response=user_client.post(url, {"recipes": ids[1:4]},
+                                  format="json")))
+
+    response = user_client.post(url, {"recipes": ids[:3]}, format="json")
+
+    assert response.status_code == 200
+    assert statuses(competing["response"]) == dict.fromkeys(ids[1:4],
+                                                            "added")
+    assert statuses(response) == {ids[0]: "added", ids[1]: "exists",
+                                  ids[2]: "exists"}
+    assert_counters(model, counter, recipes)
+
+
+@pytest.mark.parametrize("url, model, counter", KINDS)
+def test_overlapping_removes_count_each_row_once(monkeypatch, user,
+                                                 user_client, recipes, url,
+                                                 model, counter):
+    ids = [recipe.pk for recipe in recipes]
+    other = mixer.blend(type(user))
+    model.objects.bulk_create([model(user=owner, recipe_id=pk)
+                               for owner in (user, other) for pk in ids])
+    views.change_counters(Recipes, ids, counter, 2)
+    competing = {}
+    race(monkeypatch, "remove_links", lambda: competing.update(
+        response=user_client.delete(url, {"recipes": ids[1:4]},
+                                    format="json")))
+
+    response = user_client.delete(url, {"recipes": ids[:3]}, format="json")
+
+    assert response.status_code == 200
+    assert statuses(competing["response"]) == dict.fromkeys(ids[1:4],
+                                                            "removed")
+    assert statuses(response) == {ids[0]: "removed", ids[1]: "absent",
+                                  ids[2]: "absent"}
+    assert_counters(model, counter, recipes)
+
+
+def shopping_list():
+    return set(ShoppingLists.objects.values_list(
+        "user_id", "ingredient_id", "amount", "recipes_count"))
+
+
+def test_overlapping_cart_changes_keep_shopping_list_exact(
+        monkeypatch, user_client, recipes):
+    url = KINDS[0][0]
+    ids = [recipe.pk for recipe in recipes]
+    race(monkeypatch, "add_links", lambda: user_client.post(
+        url, {"recipes": ids[1:5]}, format="json"))
+    race(monkeypatch, "remove_links", lambda: user_client.delete(
+        url, {"recipes": ids[2:4]}, format="json"))
+
+    user_client.post(url, {"recipes": ids[:4]}, format="json")
+    user_client.delete(url, {"recipes": ids[1:3]}, format="json")
+
+    materialized = shopping_list()
+    assert materialized
+    rebuild()
+    assert materialized == shopping_list()
+
+
+def recount_pairs(user, recipe):
+    user.refresh_from_db()
+    recipe.refresh_from_db()
+    return (user.recipes_count, user.subscribers_count,
+            recipe.favorites_count, recipe.carts_count)
+
+
+def test_single_changes_maintain_counters(user, another_user, user_client,
+                                          another_user_client, recipes):
+    recipe = recipes[1]
+    another_user_client.post(f"/api/recipes/{recipe.id}/favorite/")
+    another_user_client.post(f"/api/recipes/{recipe.id}/shopping_cart/")
+    another_user_client.post(f"/api/users/{user.id}/subscribe/")
+    assert recount_pairs(user, recipe) == (3, 1, 1, 1)
+
+    another_user_client.delete(f"/api/recipes/{recipe.id}/favorite/")
+    another_user_client.delete(f"/api/recipes/{recipe.id}/shopping_cart/")
+    another_user_client.delete(f"/api/users/{user.id}/subscribe/")
+    user_client.delete(f"/api/recipes/{recipes[3].id}/")
+
+    assert recount_pairs(user, recipe) == (2, 0, 0, 0)
+
+
+def test_saving_stale_user_keeps_counters(user, another_user, recipes):
+    Subscribers.objects.create(user=another_user, author=user)
+
+    user.first_name = "Новое имя"
+    user.save()
+
+    user.refresh_from_db()
+    assert (user.recipes_count, user.subscribers_count) == (3, 1)
+
+
+def test_recount_fixes_drifted_counters(user, another_user, recipes):
+    recipe = recipes[1]
+    Favourites.objects.create(user=another_user, recipe=recipe)
+    Recipes.objects.filter(pk=recipe.pk).update(favorites_count=5,
+                                                carts_count=2)
+    type(user).objects.filter(pk=user.pk).update(recipes_count=0,
+                                                 subscribers_count=7)
+    out = StringIO()
+
+    call_command("recount", stdout=out)
+
+    assert recount_pairs(user, recipe) == (3, 0, 1, 0)
+    assert "recipes.favorites_count: исправлено 1" in out.getvalue()
+    assert "users.subscribers_count: исправлено 1" in out.getvalue()
@@ -0,0 +1,47 @@
+import pytest
+
+pytestmark = pytest.mark.django_db
+
+URL = "/api/recipes/by-ingredients/"
+
+
+def have(*ingredients):
+    return {"have": ",".join(str(ingredient.id)
+                             for ingredient in ingredients)}
+
+
+def test_recipes_ranked_by_matched_then_missing(anon_client, recipes,
+                                                ingredients):
+    # Рецепт n содержит ингредиенты n, n + 1 и n + 2
+    response = anon_client.get(URL, dict(have(*ingredients[1:4]),
+                                         limit=3))
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [item["id"] for item in results] == [
+        recipes[1].id, recipes[2].id, recipes[0].id]
+    assert [(item["matched_count"], item["missing_count"])
+            for item in results] == [(3, 0), (2, 1), (2, 1)]
+
+
+def test_cursor_parameter_is_ignored(anon_client, recipes, ingredients):
+    response = anon_client.get(URL, dict(have(ingredients[0]), cursor=""))
+
+    assert response.status_code == 200
+    assert response.json()["count"] == 1
+
+
+def test_index_follows_ingredient_changes(anon_client, recipes,
+                                          ingredients):
+    assert anon_client.get(URL, have(ingredients[9])).json()["count"] == 0
+
+    recipes[0].ingredients_for_recipe.create(ingredient=ingredients[9],
+                                             amount=1)
+
+    results = anon_client.get(URL, have(ingredients[9])).json()["results"]
+    assert [item["id"] for item in results] == [recipes[0].id]
+
+
+@pytest.mark.parametrize("value", ["", "a,b"])
+def test_invalid_ingredient_list(anon_client, value):
+    assert anon_client.get(URL, {"have": value}).status_code == 400
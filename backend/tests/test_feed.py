@@ -0,0 +1,170 @@
+from datetime import timedelta
+from importlib import import_module
+
+import pytest
+from django.apps import apps
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.feed import fan_out
+from recipes.models import Feeds, Recipes
+from users.models import Subscribers
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def popular(settings):
+    """Любой автор с подписчиками считается популярным."""
+    settings.FEED_FANOUT_LIMIT = 0
+    settings.FEED_BACKFILL_SIZE = 5
+
+
+def age(recipes):
+    """Разнести даты рецептов по прошлым дням, новые - последними."""
+    now = timezone.now()
+    for days, recipe in enumerate(reversed(recipes), start=1):
+        Recipes.objects.filter(pk=recipe.pk).update(
+            date=now - timedelta(days=days))
+
+
+def feed_ids(client):
+    return [item["id"]
+            for item in client.get("/api/recipes/feed/?limit=50").json()[
+                "results"]]
+
+
+def test_reading_feed_does_not_copy_old_recipes(popular, user, another_user,
+                                                user_client, make_recipe):
+    old = [make_recipe(another_user, number) for number in range(12)]
+    age(old)
+    user_client.post(f"/api/users/{another_user.id}/subscribe/")
+
+    for _ in range(3):
+        ids = feed_ids(user_client)
+
+    assert ids == [recipe.id for recipe in reversed(old[-5:])]
+    assert Feeds.objects.filter(user=user).count() == 5
+
+
+def test_reading_feed_without_new_recipes_does_not_write(
+    popular, another_user, user_client, make_recipe
+):
+    age([make_recipe(another_user, number) for number in range(3)])
+    user_client.post(f"/api/users/{another_user.id}/subscribe/")
+    feed_ids(user_client)
+
+    with CaptureQueriesContext(connection) as queries:
+        feed_ids(user_client)
+
+    assert not [query for query in queries.captured_queries
+                if query["sql"].startswith("INSERT")]
+
+
+def test_feed_pulls_new_recipes_of_popular_author(popular, another_user,
+                                                  user_client, make_recipe):
+    age([make_recipe(another_user, number) for number in range(3)])
+    user_client.post(f"/api/users/{another_user.id}/subscribe/")
+    feed_ids(user_client)
+
+    fresh = make_recipe(another_user, 10)
+
+    assert feed_ids(user_client)[0] == fresh.id
+
+
+def test_fan_out_reads_subscribers_count_from_database(
+    settings, user, another_user, django_user_model, make_recipe
+):
+    settings.FEED_FANOUT_LIMIT = 1
+    for follower in (user, django_user_model.objects.create(
+        email="third@example.com", username="third"
+    )):
+        Subscribers.objects.create(user=follower, author=another_user)
+    # Счётчик меняется в базе через F(), объект автора устарел
+    assert another_user.subscribers_count == 0
+
+    fan_out(make_recipe(another_user))
+
+    assert not Feeds.objects.exists()
+
+
+def test_new_popular_author_does_not_hide_recipes_of_others(
+    popular, user_client, another_user, django_user_model, make_recipe
+):
+    third = django_user_model.objects.create(email="third@example.com",
+                                             username="third")
+    now = timezone.now()
+    first = make_recipe(another_user, 1)
+    Recipes.objects.filter(pk=first.pk).update(date=now - timedelta(days=1))
+    user_client.post(f"/api/users/{another_user.id}/subscribe/")
+    feed_ids(user_client)
+    # Рецепт первого автора вышел раньше рецепта второго
+    missed = make_recipe(another_user, 2)
+    Recipes.objects.filter(pk=missed.pk).update(
+        date=now - timedelta(hours=1))
+    newest = make_recipe(third, 3)
+
+    user_client.post(f"/api/users/{third.id}/subscribe/")
+
+    assert feed_ids(user_client) == [newest.id, missed.id, first.id]
+
+
+def test_migration_fills_feeds_for_existing_subscriptions(
+    settings, user, another_user, make_recipe
+):
+    settings.FEED_BACKFILL_SIZE = 2
+    recipes = [make_recipe(another_user, number) for number in range(3)]
+    age(recipes)
+    Subscribers.objects.create(user=user, author=another_user)
+    Feeds.objects.all().delete()
+
+    import_module("recipes.migrations.0003_feeds").fill_feeds(apps, None)
+
+    assert set(Feeds.objects.filter(user=user).values_list(
+        "recipe_id", flat=True)) == {recipes[1].id, recipes[2].id}
+
+
+@pytest.fixture
+def prolific(user, another_user, make_recipe):
+    """Подписка на автора с 25 рецептами, новые - последними."""
+    recipes = [make_recipe(another_user, number) for number in range(25)]
+    age(recipes)
+    Subscribers.objects.create(user=user, author=another_user)
+    return [recipe.id for recipe in reversed(recipes)]
+
+
+def previews(client, query=""):
+    response = client.get(f"/api/users/subscriptions/{query}")
+    assert response.status_code == 200
+    author = response.json()["results"][0]
+    return author["recipes_count"], [item["id"]
+                                     for item in author["recipes"]]
+
+
+@pytest.mark.parametrize("query, shown", [
+    ("", 20),
+    ("?recipes_limit=3", 3),
+    ("?recipes_limit=0", 0),
+    ("?recipes_limit=100", 20),
+])
+def test_subscription_recipes_are_limited(user_client, prolific, query,
+                                          shown):
+    assert previews(user_client, query) == (25, prolific[:shown])
+
+
+def test_subscription_recipes_limit_is_capped_by_setting(settings,
+                                                         user_client,
+                                                         prolific):
+    settings.SUBSCRIPTIONS_RECIPES_LIMIT = 5
+
+    assert previews(user_client) == (25, prolific[:5])
+
+
+@pytest.mark.parametrize("value", ["-1", "abc"])
+def test_invalid_recipes_limit_is_rejected(user_client, prolific, value):
+    response = user_client.get(
+        f"/api/users/subscriptions/?recipes_limit={value}")
+
+    assert response.status_code == 400
+    assert "recipes_limit" in response.json()
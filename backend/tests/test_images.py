@@ -0,0 +1,91 @@
+import os
+
+import pytest
+from django.core.files.storage import default_storage
+
+from api.images import (DEFAULT_VARIANTS, FORMATS, render_variants,
+                        variant_names)
+from recipes.models import Recipes
+from tests.conftest import IMAGE
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def create(user_client, recipe_data, django_capture_on_commit_callbacks):
+    """Создать рецепт через API; копии строятся после фиксации."""
+    def create():
+        with django_capture_on_commit_callbacks(execute=True):
+            response = user_client.post("/api/recipes/", recipe_data,
+                                        format="json")
+        assert response.status_code == 201
+        return Recipes.objects.get(pk=response.data["id"])
+    return create
+
+
+def stored(image_name):
+    return [default_storage.exists(name) for name in variant_names(image_name)]
+
+
+def test_variants_are_rendered_named_and_served(user_client, create):
+    recipe = create()
+    stem = os.path.splitext(os.path.basename(recipe.image.name))[0]
+
+    variants = user_client.get(f"/api/recipes/{recipe.id}/").json()[
+        "image_variants"]
+
+    assert variants.keys() == DEFAULT_VARIANTS.keys()
+    for variant, urls in variants.items():
+        for extension, _, _ in FORMATS:
+            name = f"recipes/variants/{stem}_{variant}.{extension}"
+            assert urls[extension] == default_storage.url(name)
+            assert default_storage.exists(name)
+
+
+def test_replaced_image_variants_are_removed(
+    user_client, recipe_data, create, django_capture_on_commit_callbacks
+):
+    recipe = create()
+    old_image = recipe.image.name
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = user_client.patch(f"/api/recipes/{recipe.id}/",
+                                     dict(recipe_data, image=IMAGE),
+                                     format="json")
+
+    assert response.status_code == 200
+    recipe.refresh_from_db()
+    assert recipe.image.name != old_image
+    assert not any(stored(old_image))
+    assert all(stored(recipe.image.name))
+
+
+def test_deleted_recipe_variants_are_removed(
+    user_client, create, django_capture_on_commit_callbacks
+):
+    recipe = create()
+    assert all(stored(recipe.image.name))
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = user_client.delete(f"/api/recipes/{recipe.id}/")
+
+    assert response.status_code == 204
+    assert not any(stored(recipe.image.name))
+
+
+def test_variants_of_image_replaced_while_rendering_are_removed(
+    monkeypatch, create
+):
+    recipe = create()
+    image = recipe.image.name
+    real_filter = Recipes.objects.filter
+
+    def replaced(*args, **kwargs):
+        # Картинку заменили, пока строились копии
+        if kwargs.get("image") == image:
+            kwargs["image"] = "recipes/other.png"
+        return real_filter(*args, **kwargs)
+    monkeypatch.setattr(Recipes.objects, "filter", replaced)
+
+    assert render_variants(recipe.id) is None
+    assert not any(stored(image))
@@ -0,0 +1,41 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from api.checks import check_shared_caches
+
+pytestmark = pytest.mark.django_db
+
+
+def test_search_prefers_prefix_matches(anon_client, ingredients):
+    response = anon_client.get("/api/ingredients/?name=ингредиент 0")
+
+    assert response.status_code == 200
+    assert [item["name"] for item in response.json()][:2] == [
+        "ингредиент 00", "ингредиент 01"]
+
+
+def test_add_ingredients_refreshes_cached_search(tmp_path, anon_client,
+                                                 ingredients):
+    url = "/api/ingredients/?name=новый"
+    assert anon_client.get(url).json() == []
+    path = tmp_path / "ingredients.csv"
+    path.write_text("новый продукт,г\n", encoding="utf-8")
+
+    call_command("add_ingredients", path=path, stdout=StringIO())
+
+    assert [item["name"] for item in anon_client.get(url).json()] == [
+        "новый продукт"]
+
+
+def test_local_cache_is_reported_without_debug(settings):
+    settings.DEBUG = False
+    settings.CACHES = {"default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    assert [error.id for error in check_shared_caches(None)] == ["api.W001"]
+
+    settings.CACHES = {"default": {
+        "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+        "LOCATION": "memcached:11211"}}
+    assert check_shared_caches(None) == []
@@ -0,0 +1,46 @@
+import pytest
+
+from api.membership import MEMBERSHIP_KEY, forget_membership, get_cache
+from recipes.models import Favourites
+
+pytestmark = pytest.mark.django_db
+
+
+def favorited(client, recipe):
+    return client.get(f"/api/recipes/{recipe.id}/").json()["is_favorited"]
+
+
+def test_admin_delete_resets_cached_membership(user_client, recipes):
+    recipe = recipes[0]
+    user_client.post(f"/api/recipes/{recipe.id}/favorite/")
+    assert favorited(user_client, recipe)
+
+    Favourites.objects.filter(recipe=recipe).delete()
+
+    assert not favorited(user_client, recipe)
+
+
+def test_cascade_delete_resets_cached_membership(user, user_client,
+                                                 another_user, recipes):
+    recipe = recipes[0]
+    assert recipe.author == another_user
+    user_client.post(f"/api/users/{another_user.id}/subscribe/")
+    user_client.get("/api/recipes/")
+
+    another_user.delete()
+
+    assert not user_client.get(
+        "/api/users/subscriptions/").json()["results"]
+    assert get_cache().get(MEMBERSHIP_KEY.format(user.pk)) is None
+
+
+def test_membership_is_reset_again_after_commit(
+    user, django_capture_on_commit_callbacks
+):
+    key = MEMBERSHIP_KEY.format(user.pk)
+    with django_capture_on_commit_callbacks(execute=True):
+        forget_membership(user.pk)
+        # Параллельный запрос успел сохранить множества до фиксации
+        get_cache().set(key, ((1,), (), ()))
+
+    assert get_cache().get(key) is None
@@ -0,0 +1,82 @@
+import base64
+import json
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from recipes.models import Recipes
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def tied(recipes):
+    """Рецепты с одинаковыми датами парами: ключ страницы - (date, id)."""
+    now = timezone.now()
+    for number, recipe in enumerate(recipes):
+        Recipes.objects.filter(pk=recipe.pk).update(
+            date=now - timedelta(hours=number // 2))
+    return [recipe.id for recipe in Recipes.objects.order_by("-date", "-id")]
+
+
+def walk(client, url, link="next"):
+    ids, pages = [], 0
+    while url:
+        data = client.get(url).json()
+        ids += [item["id"] for item in data["results"]]
+        pages += 1
+        url = data[link]
+    return ids, pages
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4])
+def test_cursor_pages_follow_date_and_id(user_client, tied, limit):
+    ids, pages = walk(user_client, f"/api/recipes/?cursor=&limit={limit}")
+
+    assert ids == tied
+    assert pages == -(-len(tied) // limit)
+
+
+def test_cursor_previous_link_returns_same_page(user_client, tied):
+    first = user_client.get("/api/recipes/?cursor=&limit=3").json()
+    second = user_client.get(first["next"]).json()
+
+    back = user_client.get(second["previous"]).json()
+
+    assert first["previous"] is None
+    assert [item["id"] for item in second["results"]] == tied[3:]
+    assert back["results"] == first["results"]
+
+
+def test_cursor_does_not_skip_rows_added_at_same_date(user_client, tied,
+                                                      make_recipe, user):
+    first = user_client.get("/api/recipes/?cursor=&limit=3").json()
+    # Рецепт с той же датой, что и последний на странице, но меньшим id
+    # попадает после него; новый рецепт с большим id - раньше курсора.
+    last = Recipes.objects.get(pk=first["results"][-1]["id"])
+    added = make_recipe(user, 7)
+    Recipes.objects.filter(pk=added.pk).update(date=last.date)
+
+    rest, _ = walk(user_client, first["next"])
+
+    assert rest == tied[3:]
+
+
+def test_cursor_with_search_is_rejected(user_client, recipes):
+    response = user_client.get("/api/recipes/?cursor=&search=Рецепт")
+
+    assert response.status_code == 400
+    assert "cursor" in response.json()
+
+
+@pytest.mark.parametrize("cursor", [
+    "garbage",
+    base64.urlsafe_b64encode(json.dumps([["x"], False]).encode()).decode(),
+    base64.urlsafe_b64encode(
+        json.dumps([["not a date", 1], False]).encode()).decode(),
+])
+def test_invalid_cursor_is_not_found(user_client, recipes, cursor):
+    response = user_client.get(f"/api/recipes/?cursor={cursor}")
+
+    assert response.status_code == 404
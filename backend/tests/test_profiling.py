@@ -0,0 +1,68 @@
+import re
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.serializers import ListSerializer, Serializer
+from rest_framework.test import APIClient
+
+from api.profiling import Profile, fingerprint, profile_serializers
+
+pytestmark = pytest.mark.django_db
+
+ORIGINALS = {serializer_class: serializer_class.__dict__["data"]
+             for serializer_class in (Serializer, ListSerializer)}
+
+
+@pytest.fixture
+def profiled_client(settings):
+    """Middleware читает настройку при создании клиента."""
+    settings.REQUEST_PROFILING = True
+    return APIClient()
+
+
+def timing(response):
+    return dict(re.findall(r"(\w+);dur=([\d.]+)", response["Server-Timing"]))
+
+
+def assert_restored():
+    for serializer_class, original in ORIGINALS.items():
+        assert serializer_class.__dict__["data"] is original
+
+
+def test_server_timing_counts_queries(profiled_client, recipes):
+    with CaptureQueriesContext(connection) as queries:
+        response = profiled_client.get("/api/recipes/")
+
+    header = response["Server-Timing"]
+    assert f'desc="{len(queries)} queries, 0 duplicated"' in header
+    assert {"db", "serialize", "total"} <= timing(response).keys()
+    assert_restored()
+
+
+def test_profile_counts_duplicated_queries():
+    profile = Profile()
+    for sql in ("SELECT 1 WHERE id IN (%s, %s)", "SELECT 1 WHERE id IN (%s)",
+                "SELECT 2"):
+        profile(lambda *args: None, sql, (), False, {})
+
+    assert profile.duplicates == {
+        fingerprint("SELECT 1 WHERE id IN (%s)"): 2}
+
+
+def test_serializers_are_restored_after_error():
+    with pytest.raises(RuntimeError):
+        with profile_serializers():
+            assert Serializer.__dict__["data"] is not ORIGINALS[Serializer]
+            raise RuntimeError
+
+    assert_restored()
+
+
+def test_nested_profiling_restores_once():
+    with profile_serializers():
+        with profile_serializers():
+            pass
+        assert Serializer.__dict__["data"] is not ORIGINALS[Serializer]
+
+    assert_restored()
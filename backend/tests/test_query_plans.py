@@ -0,0 +1,53 @@
+import pytest
+from django.db import connection
+
+from recipes.models import Carts, Favourites, Recipes
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(connection.vendor != "postgresql",
+                       reason="Планы запросов проверяются на PostgreSQL."),
+]
+
+# Таблицы, которые список рецептов не должен читать целиком
+PROTECTED_TABLES = (
+    Recipes._meta.db_table,
+    Carts._meta.db_table,
+    Favourites._meta.db_table,
+    Recipes.tags.through._meta.db_table,
+)
+
+
+@pytest.fixture
+def plan(recipes):
+    """EXPLAIN запроса без последовательного чтения, если есть индекс."""
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("ANALYZE")
+    return lambda queryset: queryset.explain()
+
+
+@pytest.mark.parametrize("index, listing", [
+    ("recipe_date_id_idx", lambda user, tag: Recipes.objects.all()),
+    ("recipe_author_date_idx",
+     lambda user, tag: Recipes.objects.filter(author=user)),
+    ("recipe_date_id_idx", lambda user, tag: Recipes.objects.order_by(
+        "-date", "-id")),
+])
+def test_recipe_listing_uses_index(plan, user, tags, index, listing):
+    assert index in plan(listing(user, tags[0])[:6])
+
+
+@pytest.mark.parametrize("listing", [
+    lambda user, tag: Recipes.objects.filter(tags__slug=tag.slug)[:6],
+    lambda user, tag: Recipes.objects.filter(favorites__user=user)[:6],
+    lambda user, tag: Recipes.objects.filter(cart__user=user)[:6],
+    lambda user, tag: Favourites.objects.filter(user=user, recipe_id=0),
+    lambda user, tag: Carts.objects.filter(user=user, recipe_id=0),
+], ids=["tag", "favorites", "cart", "favorite exists", "cart exists"])
+def test_listing_does_not_scan_tables(plan, user, tags, listing):
+    scans = [line.strip() for line in plan(listing(user, tags[0])).splitlines()
+             if "Seq Scan" in line
+             and any(f" {table} " in f"{line} " for table in PROTECTED_TABLES)]
+
+    assert scans == []
@@ -0,0 +1,103 @@
+import pytest
+
+from recipes.models import CountIngredient, Recipes
+
+pytestmark = pytest.mark.django_db
+
+# Запись рецепта, когда членство автора уже в кэше: токен изменяющего
+# запроса читается из базы, соседи и копии картинки считаются после
+# фиксации и сюда не входят
+CREATE_QUERIES = 14
+UPDATE_QUERIES = 19
+
+
+@pytest.fixture
+def warm_client(user_client):
+    """Клиент, чей токен и членство уже в кэше."""
+    user_client.get("/api/recipes/")
+    return user_client
+
+
+def test_create_recipe_queries(warm_client, recipe_data, recipes,
+                               django_assert_num_queries):
+    with django_assert_num_queries(CREATE_QUERIES):
+        response = warm_client.post("/api/recipes/", recipe_data,
+                                    format="json")
+
+    assert response.status_code == 201
+    recipe = Recipes.objects.get(pk=response.json()["id"])
+    assert dict(recipe.ingredients_for_recipe.values_list(
+        "ingredient_id", "amount")) == {
+        item["id"]: item["amount"] for item in recipe_data["ingredients"]}
+
+
+def test_update_recipe_queries(warm_client, user, recipe_data, make_recipe,
+                               django_assert_num_queries):
+    recipe = make_recipe(user)
+    data = dict(recipe_data, name="Другое название")
+
+    with django_assert_num_queries(UPDATE_QUERIES):
+        response = warm_client.patch(f"/api/recipes/{recipe.id}/", data,
+                                     format="json")
+
+    assert response.status_code == 200
+    assert response.json()["name"] == "Другое название"
+
+
+def test_update_changes_only_differing_ingredient_rows(
+    user_client, user, recipe_data, ingredients, make_recipe
+):
+    recipe = make_recipe(user)
+    rows = {row.ingredient_id: row.id
+            for row in recipe.ingredients_for_recipe.all()}
+    kept, changed, removed = list(rows)
+    data = dict(recipe_data, ingredients=[
+        {"id": kept, "amount": 10},
+        {"id": changed, "amount": 999},
+        {"id": ingredients[9].id, "amount": 5},
+    ])
+
+    response = user_client.patch(f"/api/recipes/{recipe.id}/", data,
+                                 format="json")
+
+    assert response.status_code == 200
+    after = {row.ingredient_id: row
+             for row in recipe.ingredients_for_recipe.all()}
+    assert set(after) == {kept, changed, ingredients[9].id}
+    assert after[kept].id == rows[kept]
+    assert after[changed].id == rows[changed]
+    assert after[changed].amount == 999
+    assert not CountIngredient.objects.filter(pk=rows[removed]).exists()
+
+
+@pytest.mark.parametrize("ingredients_data", [
+    [],
+    [{"id": 1}],
+    [{"id": "abc", "amount": 1}],
+    [{"id": 1, "amount": 0}],
+    [{"id": 1, "amount": 5}, {"id": 1, "amount": 7}],
+    [{"id": 10_000, "amount": 5}],
+], ids=["empty", "no amount", "bad id", "zero amount", "duplicate",
+        "missing ingredient"])
+def test_invalid_ingredients_are_rejected(user_client, recipe_data,
+                                          ingredients, ingredients_data):
+    data = dict(recipe_data, ingredients=ingredients_data)
+
+    response = user_client.post("/api/recipes/", data, format="json")
+
+    assert response.status_code == 400
+    assert not Recipes.objects.exists()
+
+
+def test_ingredients_are_validated_in_one_query(warm_client, recipe_data,
+                                                ingredients,
+                                                django_assert_num_queries):
+    data = dict(recipe_data, ingredients=[
+        {"id": ingredient.id, "amount": 1} for ingredient in ingredients
+    ] + [{"id": 10_000, "amount": 1}])
+
+    # Токен и ингредиенты
+    with django_assert_num_queries(2):
+        response = warm_client.post("/api/recipes/", data, format="json")
+
+    assert response.status_code == 400
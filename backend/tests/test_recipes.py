@@ -0,0 +1,155 @@
+import pytest
+
+pytestmark = pytest.mark.django_db
+
+# Токен, COUNT, id страницы, рецепты с авторами, теги, ингредиенты,
+# избранное, корзина и подписки зрителя
+LIST_QUERIES = 9
+# Токен, рецепт с автором, теги, ингредиенты, избранное, корзина, подписки
+DETAIL_QUERIES = 7
+
+
+@pytest.mark.parametrize("count", [1, 12])
+def test_recipe_list_queries_do_not_depend_on_page_size(
+    count, user, another_user, user_client, make_recipe,
+    django_assert_num_queries
+):
+    for number in range(count):
+        make_recipe(user if number % 2 else another_user, number)
+
+    with django_assert_num_queries(LIST_QUERIES):
+        response = user_client.get("/api/recipes/?limit=50")
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == count
+    assert all(len(item["ingredients"]) == 3 for item in results)
+
+
+def test_recipe_list_reuses_fragments(user_client, recipes,
+                                      django_assert_num_queries):
+    user_client.get("/api/recipes/?limit=50")
+
+    # Токен, членство зрителя и карточки уже в кэше: остаются COUNT
+    # и id страницы
+    with django_assert_num_queries(2):
+        response = user_client.get("/api/recipes/?limit=50")
+
+    assert len(response.json()["results"]) == len(recipes)
+
+
+@pytest.mark.parametrize("ingredient_count", [1, 8])
+def test_recipe_detail_queries(ingredient_count, user, user_client,
+                               make_recipe, ingredients,
+                               django_assert_num_queries):
+    recipe = make_recipe(user)
+    recipe.ingredients_for_recipe.all().delete()
+    for ingredient in ingredients[:ingredient_count]:
+        recipe.ingredients_for_recipe.create(ingredient=ingredient,
+                                             amount=1)
+
+    with django_assert_num_queries(DETAIL_QUERIES):
+        response = user_client.get(f"/api/recipes/{recipe.id}/")
+
+    assert response.status_code == 200
+    assert len(response.json()["ingredients"]) == ingredient_count
+
+
+def test_recipe_detail_marks_viewer_state(user, another_user, user_client,
+                                          make_recipe):
+    recipe = make_recipe(another_user)
+    user_client.post(f"/api/recipes/{recipe.id}/favorite/")
+
+    data = user_client.get(f"/api/recipes/{recipe.id}/").json()
+
+    assert data["is_favorited"] is True
+    assert data["is_in_shopping_cart"] is False
+    assert data["author"]["id"] == another_user.id
+    assert data["author"]["is_subscribed"] is False
+
+
+def rename_recipe(client, recipe, data, ingredients):
+    client.patch(f"/api/recipes/{recipe.id}/", {**data, "name": "Новое"},
+                 format="json")
+
+
+def change_recipe_ingredients(client, recipe, data, ingredients):
+    client.patch(f"/api/recipes/{recipe.id}/", {
+        **data, "ingredients": [{"id": ingredients[9].id, "amount": 5}],
+    }, format="json")
+
+
+def rename_ingredient(client, recipe, data, ingredients):
+    ingredients[0].name = "переименованный"
+    ingredients[0].save()
+
+
+def rename_author(client, recipe, data, ingredients):
+    recipe.author.first_name = "Новое имя"
+    recipe.author.save()
+
+
+@pytest.mark.parametrize("change", [rename_recipe,
+                                    change_recipe_ingredients,
+                                    rename_ingredient, rename_author])
+def test_recipe_list_fragments_follow_changes(change, user, user_client,
+                                              recipes, recipe_data,
+                                              ingredients):
+    recipe = recipes[1]
+    assert recipe.author == user
+    response = user_client.patch(f"/api/recipes/{recipe.id}/", recipe_data,
+                                 format="json")
+    assert response.status_code == 200
+
+    def listed():
+        results = user_client.get("/api/recipes/?limit=50").json()["results"]
+        return next(item for item in results if item["id"] == recipe.id)
+    before = listed()
+
+    change(user_client, recipe, recipe_data, ingredients)
+
+    assert listed() != before
+
+
+@pytest.mark.parametrize("query, fields", [
+    ("?fields=name,cooking_time", {"id", "name", "cooking_time"}),
+    ("?fields=name&fields=tags", {"id", "name", "tags"}),
+    ("?omit=text,ingredients,author", {
+        "id", "tags", "is_favorited", "is_in_shopping_cart", "image",
+        "image_variants", "name", "cooking_time"}),
+    ("?fields=name,text&omit=text", {"id", "name"}),
+])
+def test_recipe_output_fields(user_client, recipes, query, fields):
+    listed = user_client.get(f"/api/recipes/{query}").json()["results"]
+    detail = user_client.get(f"/api/recipes/{recipes[0].id}/{query}").json()
+
+    assert all(item.keys() == fields for item in listed)
+    assert detail.keys() == fields
+
+
+def test_recipe_detail_skips_omitted_relations(user_client, recipes,
+                                               django_assert_num_queries):
+    # Без тегов, ингредиентов и полей зрителя: токен и рецепт
+    with django_assert_num_queries(2):
+        response = user_client.get(
+            f"/api/recipes/{recipes[0].id}/?fields=name,cooking_time")
+
+    assert response.json() == {"id": recipes[0].id,
+                               "name": recipes[0].name,
+                               "cooking_time": recipes[0].cooking_time}
+
+
+def test_user_output_fields(user, user_client):
+    response = user_client.get("/api/users/me/?fields=username")
+
+    assert response.json() == {"id": user.id, "username": user.username}
+
+
+@pytest.mark.parametrize("url", ["/api/recipes/?fields=name,bogus",
+                                 "/api/recipes/?omit=bogus",
+                                 "/api/users/?fields=password"])
+def test_unknown_output_fields_are_rejected(user_client, recipes, url):
+    response = user_client.get(url)
+
+    assert response.status_code == 400
+    assert "Неизвестные поля" in response.json()["fields"]
@@ -0,0 +1,45 @@
+import datetime
+import decimal
+
+import pytest
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import FastJSONRenderer
+
+pytest.importorskip("orjson")
+
+SAME = [
+    {"name": "Борщ", "amount": 10, "empty": None, "flag": True},
+    {"date": datetime.datetime(2023, 5, 1, 12, 30, 15, 123456,
+                               tzinfo=datetime.timezone.utc),
+     "day": datetime.date(2023, 5, 1), "time": datetime.time(8, 5)},
+    {"price": decimal.Decimal("12.50"), "lazy": gettext_lazy("Рецепты")},
+    {"text": "строка\u2028и\u2029абзац", 1: "ключ-число"},
+    {"big": 2 ** 70, "list": [1, [2, {"3": []}]]},
+]
+
+
+@pytest.mark.parametrize("data", SAME)
+def test_fast_renderer_matches_drf(data):
+    assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+def test_fast_renderer_float_exponent_differs():
+    # Известное отличие, см. FastJSONRenderer
+    assert FastJSONRenderer().render({"value": 1e16}) == b'{"value":1e16}'
+    assert JSONRenderer().render({"value": 1e16}) == b'{"value":1e+16}'
+
+
+def test_fast_renderer_renders_nan_as_null():
+    with pytest.raises(ValueError):
+        JSONRenderer().render({"value": float("nan")})
+    assert FastJSONRenderer().render(
+        {"value": float("nan")}) == b'{"value":null}'
+
+
+def test_fast_renderer_keeps_indent_of_drf():
+    context = {"indent": 2}
+    assert FastJSONRenderer().render(
+        {"a": [1]}, renderer_context=context
+    ) == JSONRenderer().render({"a": [1]}, renderer_context=context)
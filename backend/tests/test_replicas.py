@@ -0,0 +1,108 @@
+import pytest
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api import replicas
+from api.replicas import (PRIMARY, ReplicaRouter, ReplicaState,
+                          use_primary)
+from recipes.models import Recipes
+from tests.conftest import client_for
+
+replica_db = pytest.mark.django_db(transaction=True,
+                                   databases=["default", "replica"])
+
+
+@pytest.fixture
+def with_replica(settings):
+    """Реплика в тестах - зеркало основной базы. Middleware читает
+    настройку при создании клиента, поэтому клиенты создаются после
+    этой фикстуры."""
+    settings.REPLICA_DATABASES = ["replica"]
+
+
+@pytest.fixture
+def state():
+    token = replicas._state.set(ReplicaState(primary=False,
+                                             replica="replica"))
+    yield replicas._state.get()
+    replicas._state.reset(token)
+
+
+class Queries:
+    """Запросы к основной базе и к реплике за время блока."""
+
+    def __enter__(self):
+        self.contexts = {alias: CaptureQueriesContext(connections[alias])
+                         for alias in (PRIMARY, "replica")}
+        for context in self.contexts.values():
+            context.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        for context in self.contexts.values():
+            context.__exit__(*exc)
+
+    def count(self, alias):
+        return len(self.contexts[alias])
+
+
+@replica_db
+def test_safe_request_reads_from_replica(with_replica, recipes):
+    client = APIClient()
+    with Queries() as queries:
+        response = client.get("/api/recipes/")
+    assert response.status_code == 200
+    assert queries.count("replica") > 0
+    assert queries.count(PRIMARY) == 0
+
+
+@replica_db
+def test_replica_is_chosen_once_per_request(with_replica, recipes,
+                                            monkeypatch):
+    choices = []
+
+    def choice(options):
+        choices.append(options)
+        return options[0]
+    monkeypatch.setattr(replicas.random, "choice", choice)
+    client = APIClient()
+    with Queries() as queries:
+        client.get(f"/api/recipes/{recipes[0].pk}/")
+    assert queries.count("replica") > 1
+    assert choices == [["replica"]]
+
+
+@replica_db
+def test_client_reads_own_writes_from_primary(with_replica, user,
+                                              recipe_data):
+    client = client_for(user)
+    response = client.post("/api/recipes/", recipe_data, format="json")
+    assert response.status_code == 201
+    recipe_id = response.data["id"]
+
+    with Queries() as queries:
+        response = client.get(f"/api/recipes/{recipe_id}/")
+    assert response.status_code == 200
+    assert queries.count("replica") == 0
+    # Другой клиент по-прежнему читает с реплики.
+    with Queries() as queries:
+        APIClient().get(f"/api/recipes/{recipe_id}/")
+    assert queries.count(PRIMARY) == 0
+
+
+def test_use_primary_restores_previous_state(state):
+    router = ReplicaRouter()
+    with use_primary():
+        assert router.db_for_read(Recipes) == PRIMARY
+        with use_primary():
+            pass
+        assert router.db_for_read(Recipes) == PRIMARY
+    assert router.db_for_read(Recipes) == "replica"
+
+
+def test_use_primary_keeps_primary_after_write(state):
+    router = ReplicaRouter()
+    with use_primary():
+        router.db_for_write(Recipes)
+    assert router.db_for_read(Recipes) == PRIMARY
@@ -0,0 +1,152 @@
+import pytest
+
+from api import recipe_fragments, response_cache
+from recipes.models import Recipes
+
+pytestmark = pytest.mark.django_db
+
+
+def test_anonymous_list_is_served_from_cache(anon_client, recipes,
+                                             django_assert_num_queries):
+    first = anon_client.get("/api/recipes/")
+
+    with django_assert_num_queries(0):
+        second = anon_client.get("/api/recipes/")
+
+    assert second.json() == first.json()
+    assert second["ETag"] == first["ETag"]
+
+
+def test_anonymous_etag_gives_not_modified(anon_client, recipes):
+    etag = anon_client.get("/api/recipes/")["ETag"]
+
+    response = anon_client.get("/api/recipes/", HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+
+
+def test_authenticated_responses_are_not_cached(user_client, recipes):
+    user_client.get("/api/recipes/")
+
+    response = user_client.get("/api/recipes/")
+
+    assert "ETag" not in response
+
+
+def test_change_invalidates_cached_detail(anon_client, recipes):
+    recipe = recipes[0]
+    anon_client.get(f"/api/recipes/{recipe.id}/")
+    recipe.name = "Новое имя"
+    recipe.save()
+
+    assert anon_client.get(
+        f"/api/recipes/{recipe.id}/").json()["name"] == "Новое имя"
+
+
+def test_cache_key_includes_host(settings, anon_client, recipes):
+    settings.ALLOWED_HOSTS = ["a.example", "b.example"]
+    anon_client.get("/api/recipes/?limit=1", HTTP_HOST="a.example")
+
+    response = anon_client.get("/api/recipes/?limit=1", secure=True,
+                               HTTP_HOST="b.example")
+
+    assert response.json()["next"].startswith("https://b.example/")
+
+
+def change_while_building(monkeypatch, module, name, recipe):
+    """Перед тем как ответ сохранится в кэш, изменить рецепт: как будто
+    запись зафиксировалась, пока ответ собирался из старых данных."""
+    real = getattr(module, name)
+
+    def racing(*args, **kwargs):
+        monkeypatch.setattr(module, name, real)
+        Recipes.objects.filter(pk=recipe.pk).update(name="Новое имя")
+        response_cache.invalidate("recipes", f"recipe:{recipe.pk}")
+        return real(*args, **kwargs)
+    monkeypatch.setattr(module, name, racing)
+
+
+def test_response_built_during_change_is_not_kept(monkeypatch, anon_client,
+                                                  recipes):
+    recipe = recipes[0]
+    change_while_building(monkeypatch, response_cache, "FastJSONRenderer",
+                          recipe)
+    assert anon_client.get(
+        f"/api/recipes/{recipe.id}/").json()["name"] != "Новое имя"
+
+    assert anon_client.get(
+        f"/api/recipes/{recipe.id}/").json()["name"] == "Новое имя"
+
+
+def test_fragment_built_during_change_is_not_kept(monkeypatch, user_client,
+                                                  recipes):
+    recipe = recipes[0]
+    change_while_building(monkeypatch, recipe_fragments, "store_fragments",
+                          recipe)
+
+    def listed():
+        results = user_client.get("/api/recipes/?limit=50").json()["results"]
+        return next(item for item in results if item["id"] == recipe.id)
+    assert listed()["name"] != "Новое имя"
+
+    assert listed()["name"] == "Новое имя"
+
+
+DOWNLOAD = "/api/recipes/download_shopping_cart/?format={}"
+
+
+@pytest.fixture
+def cart(user_client, recipes):
+    user_client.post(f"/api/recipes/{recipes[0].id}/shopping_cart/")
+    return recipes[0]
+
+
+@pytest.mark.parametrize("file_format", ["txt", "csv"])
+def test_shopping_cart_download_is_not_modified(
+    file_format, user_client, cart, django_assert_num_queries
+):
+    url = DOWNLOAD.format(file_format)
+    response = user_client.get(url)
+    assert response.status_code == 200
+    assert "ингредиент 00" in b"".join(
+        response.streaming_content).decode()
+
+    # Токен и корзина в кэше: 304 отдаётся без запросов к базе
+    with django_assert_num_queries(0):
+        repeated = user_client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    assert repeated.status_code == 304
+    assert repeated["ETag"] == response["ETag"]
+
+
+def change_cart(client, cart, recipes):
+    client.post(f"/api/recipes/{recipes[1].id}/shopping_cart/")
+
+
+def change_recipe(client, cart, recipes):
+    row = cart.ingredients_for_recipe.first()
+    row.amount += 1
+    row.save()
+
+
+@pytest.mark.parametrize("file_format", ["txt", "csv"])
+@pytest.mark.parametrize("change", [change_cart, change_recipe])
+def test_shopping_cart_etag_changes_with_cart_and_recipes(
+    file_format, change, user_client, cart, recipes
+):
+    url = DOWNLOAD.format(file_format)
+    etag = user_client.get(url)["ETag"]
+
+    change(user_client, cart, recipes)
+    response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+def test_json_shopping_cart_has_no_etag(user_client, cart):
+    response = user_client.get(DOWNLOAD.format("json"))
+
+    assert response.status_code == 200
+    assert "ETag" not in response
@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.utils import timezone
+
+from recipes import search
+from recipes.models import CountIngredient, Ingredients, Recipes
+
+pytestmark = pytest.mark.django_db
+
+postgres_only = pytest.mark.skipif(
+    connection.vendor != "postgresql",
+    reason="Триггеры и GIN-индекс есть только в PostgreSQL.")
+
+
+@pytest.fixture
+def ranked(user, make_recipe):
+    """Рецепт со словом в названии старше рецепта со словом в описании."""
+    in_name = make_recipe(user, 0, name="Борщ домашний")
+    in_text = make_recipe(user, 1, name="Суп", text="Почти борщ")
+    Recipes.objects.filter(pk=in_name.pk).update(
+        date=timezone.now() - timedelta(days=1))
+    return in_name, in_text
+
+
+def matching(word):
+    return Recipes.objects.filter(
+        search_vector=SearchQuery(word, config=search.SEARCH_CONFIG))
+
+
+def search_ids(client, value):
+    response = client.get("/api/recipes/", {"search": value, "limit": 50})
+    return [item["id"] for item in response.json()["results"]]
+
+
+def test_search_ranks_name_above_text(user_client, ranked):
+    in_name, in_text = ranked
+
+    assert search_ids(user_client, "борщ") == [in_name.id, in_text.id]
+
+
+def test_search_finds_recipe_by_ingredient(user_client, user, make_recipe):
+    recipe = make_recipe(user)
+    CountIngredient.objects.create(
+        recipe=recipe, amount=1,
+        ingredient=Ingredients.objects.create(name="морковь",
+                                              measurement_unit="г"))
+
+    assert search_ids(user_client, "морковь") == [recipe.id]
+
+
+def test_fallback_search_caps_results(settings, monkeypatch, user_client,
+                                      recipes):
+    if connection.vendor == "postgresql":
+        pytest.skip("Индекс процесса используется без PostgreSQL.")
+    monkeypatch.setattr(search, "FALLBACK_LIMIT", 2)
+
+    assert len(search_ids(user_client, "рецепт")) == 2
+
+
+def test_admin_search_keeps_rank_order(admin_client, ranked):
+    in_name, in_text = ranked
+
+    response = admin_client.get("/admin/recipes/recipes/", {"q": "борщ"})
+
+    assert response.status_code == 200
+    assert list(response.context["cl"].result_list) == [in_name, in_text]
+
+
+def test_admin_column_ordering_overrides_rank(admin_client, ranked):
+    in_name, in_text = ranked
+
+    response = admin_client.get("/admin/recipes/recipes/",
+                                {"q": "борщ", "o": "-2"})
+
+    assert list(response.context["cl"].result_list) == [in_text, in_name]
+
+
+@postgres_only
+def test_trigger_keeps_search_vector_current(user, make_recipe):
+    recipe = make_recipe(user, name="Окрошка")
+    assert matching("окрошка").exists()
+
+    ingredient = recipe.ingredients_for_recipe.first().ingredient
+    ingredient.name = "квас"
+    ingredient.save()
+    recipe.name = "Холодный суп"
+    recipe.save()
+
+    assert list(matching("квас")) == [recipe]
+    assert not matching("окрошка").exists()
+
+
+@postgres_only
+def test_websearch_syntax(user_client, ranked):
+    in_name, in_text = ranked
+
+    assert search_ids(user_client, "борщ -почти") == [in_name.id]
+    assert search_ids(user_client, '"домашний борщ"') == []
+
+
+@postgres_only
+def test_search_uses_gin_index(user, ranked):
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+    plan = search.search_recipes(Recipes.objects.all(), "борщ").explain()
+
+    assert "recipe_search_idx" in plan
@@ -0,0 +1,83 @@
+import pytest
+
+from api.similar_recipes import compute_all, update_neighbours
+from recipes.models import Neighbours
+
+pytestmark = pytest.mark.django_db
+
+
+def similar_ids(client, recipe_id):
+    response = client.get(f"/api/recipes/{recipe_id}/similar/")
+    assert response.status_code == 200
+    return [item["id"] for item in response.json()]
+
+
+def test_similar_of_missing_recipe_is_404(anon_client):
+    assert anon_client.get("/api/recipes/10000/similar/").status_code == 404
+
+
+def test_neighbours_are_computed_after_commit(
+    user_client, anon_client, recipes, recipe_data,
+    django_capture_on_commit_callbacks
+):
+    # recipe_data: ингредиенты 0 и 1, как у рецептов 0 и 1 из recipes
+    with django_capture_on_commit_callbacks() as callbacks:
+        recipe_id = user_client.post("/api/recipes/", recipe_data,
+                                     format="json").json()["id"]
+    assert not Neighbours.objects.filter(recipe_id=recipe_id).exists()
+
+    for callback in callbacks:
+        callback()
+
+    assert similar_ids(anon_client, recipe_id) == [recipes[0].id,
+                                                   recipes[1].id]
+    assert recipe_id in similar_ids(anon_client, recipes[0].id)
+
+
+def test_neighbours_follow_recipe_update(
+    user, user_client, anon_client, recipes, recipe_data, ingredients,
+    django_capture_on_commit_callbacks
+):
+    recipe = recipes[1]
+    data = dict(recipe_data, ingredients=[
+        {"id": ingredient.id, "amount": 1} for ingredient in ingredients[4:7]
+    ])
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user_client.patch(f"/api/recipes/{recipe.id}/", data, format="json")
+
+    # Теперь рецепт делит ингредиенты с рецептами 2-5, но не с 0
+    assert set(similar_ids(anon_client, recipe.id)) == {
+        other.id for other in recipes[2:]}
+    assert recipe.id not in similar_ids(anon_client, recipes[0].id)
+
+
+def neighbour_pairs():
+    return sorted(Neighbours.objects.values_list("recipe_id", "neighbour_id",
+                                                 "score"))
+
+
+def test_compute_all_does_not_depend_on_batch_size(recipes):
+    compute_all(batch_size=1)
+    by_one = neighbour_pairs()
+    compute_all(batch_size=256)
+
+    assert neighbour_pairs() == by_one
+    # Ингредиенты рецепта n - (n + i) % 10, i = 0..2: у рецептов 0 и 5
+    # общих ингредиентов нет
+    assert not Neighbours.objects.filter(recipe=recipes[0],
+                                         neighbour=recipes[5]).exists()
+    assert Neighbours.objects.filter(recipe=recipes[0],
+                                     neighbour=recipes[1]).exists()
+
+
+def test_compute_all_matches_incremental_update(recipes):
+    compute_all()
+    full = neighbour_pairs()
+    Neighbours.objects.all().delete()
+
+    for recipe in recipes:
+        update_neighbours(recipe.id)
+
+    assert [pair[:2] for pair in neighbour_pairs()] == [
+        pair[:2] for pair in full]
@@ -20,6 +20,16 @@ class Users(AbstractUser):
     is_active = models.BooleanField(
         verbose_name="Активация",
         default=True,)
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="Количество рецептов",
+        default=0,
+        editable=False,
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name="Количество подписчиков",
+        default=0,
+        editable=False,
+    )
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ("username", "first_name", "last_name")
@@ -28,6 +38,16 @@ class Users(AbstractUser):
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
 
+    def save(self, *args, **kwargs):
+        """Счётчики меняются только через F(), сохранение их не затирает."""
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ("recipes_count", "subscribers_count")
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.username
 